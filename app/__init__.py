@@ -1,13 +1,17 @@
 """Application factory module"""
+import multiprocessing
 
 from flask import Flask
 from flask_cors import CORS
 
-from app.db.scripts.db_scripts import create_tables
+from app.db.scripts.db_scripts import create_tables, reload_data_command, archive_season_command, \
+    handle_snapshot_swap
 from app.utils import error_response
+from app.constants import RETRY_AFTER_HEADER
 from config import config, CACHE_CONFIG
 from app.extensions import db_wrapper, cache, swagger
 from app.api import api_bp
+from app.profiling import profiles_command
 
 
 def create_app(config_name) -> Flask:
@@ -20,14 +24,26 @@ def create_app(config_name) -> Flask:
     app.register_blueprint(api_bp)
 
     db_wrapper.init_app(app)
+    # Attach archived seasons to the database of the current season.
+    db_wrapper.database.init_app(app)
     swagger.init_app(app)
     CORS(app)  # For handling Cross Origin Resource Sharing in Swagger UI
     cache.init_app(app, config=CACHE_CONFIG)
 
     register_error_handlers(app)
-
-    # Create db and tables.
-    create_tables()
+    # Register commands for aggregation of request profiles, data reload
+    # and archiving of the season.
+    app.cli.add_command(profiles_command)
+    app.cli.add_command(reload_data_command)
+    app.cli.add_command(archive_season_command)
+    # Invalidate and warm up cached responses if database is reloaded by another process.
+    app.before_request(handle_snapshot_swap)
+
+    # Create db and tables. Processes spawned to parse logs import the
+    # main module again, which creates the app, they never reload data.
+    if multiprocessing.parent_process() is None:
+        with app.app_context():
+            create_tables()
 
     return app
 
@@ -39,6 +55,17 @@ def register_error_handlers(app: Flask):
         app: Flask instance
     """
 
+    @app.errorhandler(400)
+    def bad_request(e):
+        """Bad request handler.
+
+        Function will be called when an 400 error occurs in API endpoint or APP.
+
+        Returns:
+            Response in xml or json format.
+        """
+        return error_response(e)
+
     @app.errorhandler(404)
     def resource_not_found(e):
         """Page not found handler.
@@ -50,6 +77,21 @@ def register_error_handlers(app: Flask):
         """
         return error_response(e)
 
+    @app.errorhandler(503)
+    def service_unavailable(e):
+        """Service unavailable handler.
+
+        Function will be called when a database query is shed,
+        client should retry after Retry-After seconds.
+
+        Returns:
+            Response in xml or json format with 503 status.
+        """
+        response = error_response(e, status=503)
+        if getattr(e, "retry_after", None) is not None:
+            response.headers[RETRY_AFTER_HEADER] = str(e.retry_after)
+        return response
+
     @app.errorhandler(500)
     def internal_server_error(e):
         """Internal server error handler.
@@ -1,7 +1,17 @@
 from flask import Blueprint
 from app.api.api_class import Api
+from app.compression import cached_response, compress_response
+from app.profiling import start_profiling, stop_profiling, cancel_profiling
 
 api_bp = Blueprint('api', __name__)
 api = Api(api_bp, prefix="/api/v1")
 
-from . import routes
\ No newline at end of file
+# Profile requested requests, profiling is started first and stopped last.
+api_bp.before_request(start_profiling)
+api_bp.after_request(stop_profiling)
+api_bp.teardown_request(cancel_profiling)
+# Serve cached responses and compress new ones.
+api_bp.before_request(cached_response)
+api_bp.after_request(compress_response)
+
+from . import routes
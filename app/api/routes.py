@@ -1,45 +1,155 @@
 """Module for API"""
-from flask import request, Response, abort, current_app
+from typing import Optional
+
+from flask import request, Response, abort, current_app, stream_with_context, jsonify
 from flask_restful import Resource
 from flasgger import swag_from
 
-from app.utils import create_response
+from app.utils import create_response, create_bulk_response, parse_fields, parse_version, \
+    parse_lap_time
 from app.api import api
+from app.stream import broadcaster, stream_events, remember_standings
 from app.constants import RESPONSE_TAG, DRIVER_TAG, ORDER_PARAMETER, FORMAT_PARAMETER, \
-    REPORT_DOC, DRIVERS_DOC, SINGLE_DRIVER_DOC, DRIVER_NOT_FOUND
-from app.db.models import Driver, Result
+    REPORT_DOC, DRIVERS_DOC, SINGLE_DRIVER_DOC, DRIVER_NOT_FOUND, FIELDS_PARAMETER, \
+    REPORT_FIELDS, REPORT_DEFAULT_FIELDS, DRIVERS_FIELDS, DRIVERS_DEFAULT_FIELDS, \
+    SINGLE_DRIVER_FIELDS, SINGLE_DRIVER_DEFAULT_FIELDS, BULK_FORMATS, REPORT_STREAM_DOC, \
+    STREAM_FIELDS, TEXT_EVENT_STREAM, SINCE_PARAMETER, TEAM_PARAMETER, LAP_MIN_PARAMETER, \
+    LAP_MAX_PARAMETER, NAME_PREFIX_PARAMETER, METRICS_DOC, SEASON_PARAMETER, SEASON_NOT_FOUND, \
+    DRIVER_HISTORY_DOC, SINCE_NOT_SUPPORTED
+from app.db.models import Driver, Result, Filters
+from app.db.admission import admission
+from app.extensions import db_wrapper
+
+
+def get_filters() -> Filters:
+    """Gets filters from the request.
+
+    Returns:
+        filters of report and drivers.
+    """
+    lap_min = request.args.get(LAP_MIN_PARAMETER)
+    lap_max = request.args.get(LAP_MAX_PARAMETER)
+    return Filters(team=request.args.get(TEAM_PARAMETER) or None,
+                   lap_min=parse_lap_time(lap_min) if lap_min else None,
+                   lap_max=parse_lap_time(lap_max) if lap_max else None,
+                   name_prefix=request.args.get(NAME_PREFIX_PARAMETER) or None)
+
+
+def get_season() -> Optional[str]:
+    """Gets archived season from the request.
+
+    Returns:
+        archived season or None for the current season.
+    """
+    season = request.args.get(SEASON_PARAMETER) or None
+    if season is None or season == current_app.config["SEASON"]:
+        return None
+    if season not in db_wrapper.database.seasons():
+        abort(404, description=SEASON_NOT_FOUND.format(season,
+                                                       ", ".join(db_wrapper.database.seasons())))
+    return season
 
 
 class Report(Resource):
     """Class for actions with report"""
     @swag_from(REPORT_DOC)
     def get(self) -> Response:
-        """Returns race report in json or xml format.
+        """Returns race report in json, xml, csv or columnar json format.
 
         Returns:
-            Response object in json or xml format.
+            Response object in json, xml, csv or columnar json format.
         """
+        fields = parse_fields(request.args.get(FIELDS_PARAMETER),
+                              allowed=REPORT_FIELDS,
+                              default=REPORT_DEFAULT_FIELDS)
+        filters = get_filters()
+        season = get_season()
+        response_format = request.args.get(FORMAT_PARAMETER)
+        since = request.args.get(SINCE_PARAMETER)
+        if since is not None:
+            if response_format in BULK_FORMATS:
+                abort(400, description=SINCE_NOT_SUPPORTED.format(response_format))
+            # Only results changed since the client's data version.
+            changes = Result.get_report_changes(parse_version(since),
+                                                request.args.get(ORDER_PARAMETER),
+                                                fields,
+                                                filters,
+                                                season)
+            return create_response(response_format=response_format,
+                                   data=changes,
+                                   root=RESPONSE_TAG)
+        if response_format in BULK_FORMATS:
+            # Read results directly from the query cursor.
+            rows = Result.iter_report(request.args.get(ORDER_PARAMETER), fields, filters, season)
+            return create_bulk_response(response_format, columns=fields, rows=rows)
+
         # Get report from database
-        report = Result.get_report(request.args.get(ORDER_PARAMETER))
+        report = Result.get_report(request.args.get(ORDER_PARAMETER), fields, filters, season)
         # return json or xml response
-        return create_response(response_format=request.args.get(FORMAT_PARAMETER),
+        return create_response(response_format=response_format,
                                data=report,
                                root=RESPONSE_TAG)
 
 
+class ReportStream(Resource):
+    """Class for live leaderboard stream"""
+    @swag_from(REPORT_STREAM_DOC)
+    def get(self) -> Response:
+        """Returns stream of Server-Sent Events with standings and place changes.
+
+        Current standings are sent first, then only place changes
+        when laps are ingested.
+
+        Returns:
+            Streamed Response object in text/event-stream format.
+        """
+        # Subscribe before reading standings, so no changes are missed.
+        subscriber = broadcaster.subscribe()
+        try:
+            standings = Result.get_report(None, STREAM_FIELDS)
+        except Exception:
+            broadcaster.unsubscribe(subscriber)
+            raise
+        remember_standings(standings)
+        response = Response(stream_with_context(stream_events(subscriber, standings)),
+                            mimetype=TEXT_EVENT_STREAM,
+                            headers={"Cache-Control": "no-cache",
+                                     "X-Accel-Buffering": "no"})
+        # Subscriber is removed even if the stream is closed before it is started.
+        response.call_on_close(lambda: broadcaster.unsubscribe(subscriber))
+        return response
+
+
 class Drivers(Resource):
     """Class for actions with drivers"""
     @swag_from(DRIVERS_DOC)
     def get(self) -> Response:
-        """Returns list of drivers in json or xml format
+        """Returns list of drivers in json, xml, csv or columnar json format
 
         Returns:
-            Response object in json or xml.
+            Response object in json, xml, csv or columnar json.
         """
+        fields = parse_fields(request.args.get(FIELDS_PARAMETER),
+                              allowed=DRIVERS_FIELDS,
+                              default=DRIVERS_DEFAULT_FIELDS)
+        filters = get_filters()
+        season = get_season()
+        response_format = request.args.get(FORMAT_PARAMETER)
+        if response_format in BULK_FORMATS:
+            # Read drivers directly from the query cursor.
+            rows = Driver.iter_drivers(order=request.args.get(ORDER_PARAMETER),
+                                       fields=fields,
+                                       filters=filters,
+                                       season=season)
+            return create_bulk_response(response_format, columns=fields, rows=rows)
+
         # Get drivers from database
-        drivers = Driver.get_drivers(order=request.args.get(ORDER_PARAMETER))
+        drivers = Driver.get_drivers(order=request.args.get(ORDER_PARAMETER),
+                                     fields=fields,
+                                     filters=filters,
+                                     season=season)
         # return json or xml response
-        return create_response(response_format=request.args.get(FORMAT_PARAMETER),
+        return create_response(response_format=response_format,
                                data=drivers,
                                root="response")
 
@@ -57,9 +167,13 @@ class SingleDriver(Resource):
             If converts to xml format, return Response object with xml
             else returns driver object.
         """
+        fields = parse_fields(request.args.get(FIELDS_PARAMETER),
+                              allowed=SINGLE_DRIVER_FIELDS,
+                              default=SINGLE_DRIVER_DEFAULT_FIELDS)
+        season = get_season()
         try:
             # Get driver from database
-            driver = Driver.get_single_driver(driver_id)
+            driver = Driver.get_single_driver(driver_id, fields, season)
         except UserWarning:
             # Driver not found.
             current_app.logger.info(DRIVER_NOT_FOUND, driver_id)
@@ -70,7 +184,54 @@ class SingleDriver(Resource):
                                root=DRIVER_TAG)
 
 
+class DriverHistory(Resource):
+    """Class for results of specific driver in every season"""
+    @swag_from(DRIVER_HISTORY_DOC)
+    def get(self, driver_id: str) -> Response:
+        """Returns results of the driver in every season in json or xml format.
+
+        Args:
+            driver_id: driver abbreviation.
+
+        Returns:
+            Response object in json or xml format.
+        """
+        try:
+            # Get results from the current and archived seasons.
+            history = Driver.get_history(driver_id)
+        except UserWarning:
+            # Driver not found.
+            current_app.logger.info(DRIVER_NOT_FOUND, driver_id)
+            abort(404, description=f"A driver with the '{driver_id}' ID  was not found.")
+        return create_response(response_format=request.args.get(FORMAT_PARAMETER),
+                               data=history,
+                               root=RESPONSE_TAG)
+
+
+class Metrics(Resource):
+    """Class for metrics of the service"""
+    @swag_from(METRICS_DOC)
+    def get(self) -> Response:
+        """Returns limits, queue depth and counters of database queries.
+
+        Returns:
+            Response object in json format, which is not cached.
+        """
+        metrics = admission.metrics()
+        response = jsonify(db_max_concurrency=current_app.config["DB_MAX_CONCURRENCY"],
+                           db_max_queue=current_app.config["DB_MAX_QUEUE"],
+                           db_active=metrics["active"],
+                           db_queue_depth=metrics["waiting"],
+                           db_admitted=metrics["admitted"],
+                           db_shed=metrics["shed"])
+        response.cache_control.no_store = True
+        return response
+
+
 # Add a resource to the api.
 api.add_resource(Report, "/report/")
+api.add_resource(ReportStream, "/report/stream")
 api.add_resource(Drivers, "/report/drivers/")
 api.add_resource(SingleDriver, "/report/drivers/<string:driver_id>")
+api.add_resource(DriverHistory, "/report/drivers/<string:driver_id>/history")
+api.add_resource(Metrics, "/metrics")
@@ -0,0 +1,318 @@
+"""Module for async serving mode.
+
+The Flask application is wrapped in an ASGI application, so it can be
+served by an ASGI server with many concurrent connections, e.g.:
+
+    uvicorn asgi:app
+
+Responses cached for the request are served in the event loop. Other
+requests are handled by the same routes, which query the database, on a
+bounded pool of DB_EXECUTOR_WORKERS threads, so a slow database read ties
+up a pool thread instead of a connection. Concurrent requests for a response
+which is being created wait for it in the event loop instead of creating it
+again. Bodies of streamed responses are read on a separate pool of
+STREAM_EXECUTOR_WORKERS threads, one thread per stream, so long-lived streams
+do not hold database threads. When all stream threads are taken, new streams
+are refused with 503 Service Unavailable.
+"""
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from flask import Flask, Response, request
+
+from app import create_app
+from app.api import api_bp
+from app.compression import cached_response, negotiate_encoding, response_cache_key
+from app.db.admission import Overloaded
+from app.db.scripts.db_scripts import handle_snapshot_swap
+from app.profiling import profiling_requested
+
+
+class AsyncApp:
+    """ASGI application which serves the Flask application"""
+
+    def __init__(self, app: Flask, workers: int, streams: int):
+        """
+        Args:
+            app: Flask application.
+            workers: number of threads which handle not cached requests.
+            streams: maximum number of concurrently streamed responses.
+        """
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self.stream_executor = ThreadPoolExecutor(max_workers=streams, thread_name_prefix="stream")
+        self.max_streams = streams
+        # Streamed responses which are being sent, changed only in the event loop.
+        self.streams = 0
+        # Responses which are created in the pool by cache key.
+        self.pending: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope: dict, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Handles startup and shutdown of the server."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                # Streams end when their connections are closed.
+                self.stream_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope: dict, receive, send):
+        """Handles HTTP request.
+
+        Args:
+            scope: connection scope.
+            receive: function which receives request messages.
+            send: function which sends response messages.
+        """
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        environ = create_environ(scope, body)
+
+        response, key = self.cached_response(environ)
+        if response is None and key in self.pending:
+            # The same response is being created, it is served from the
+            # cache when it is created, so it is not created again.
+            await self.pending[key]
+            response, _ = self.cached_response(environ)
+            key = None
+        if response is not None:
+            await send_start(send, response.status_code, response.headers.items())
+            await send({"type": "http.response.body", "body": response.get_data()})
+            return
+
+        loop = asyncio.get_running_loop()
+        if key is not None:
+            self.pending[key] = loop.create_future()
+        try:
+            status, headers, body, chunks = await loop.run_in_executor(self.executor, self.handle, environ)
+        finally:
+            if key is not None:
+                self.pending.pop(key).set_result(None)
+        if chunks is not None and self.streams >= self.max_streams:
+            # No stream thread is free, so the stream is not started.
+            if hasattr(chunks, "close"):
+                chunks.close()
+            response = self.refused_response(environ)
+            status, headers, body, chunks = (response.status_code, response.headers.items(),
+                                             response.get_data(), None)
+        if chunks is None:
+            await send_start(send, status, headers)
+            await send({"type": "http.response.body", "body": body})
+            return
+        # Stream thread is taken before the first await, so streams which
+        # arrive together can not all pass the check above.
+        self.streams += 1
+        try:
+            try:
+                await send_start(send, status, headers)
+            except BaseException:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+                raise
+            await stream_body(chunks, receive, send, self.stream_executor)
+        finally:
+            self.streams -= 1
+
+    def cached_response(self, environ: dict) -> tuple[Optional[Response], Optional[str]]:
+        """Gets cached response without querying the database.
+
+        Args:
+            environ: WSGI environment of the request.
+
+        Returns:
+            Response object processed as in the Flask application or None,
+            and cache key of the response or None if it is not cached.
+        """
+        with self.app.request_context(environ):
+            handle_snapshot_swap()
+            # Only API responses are cached, profiled requests bypass caches.
+            if (request.method != "GET"
+                    or request.blueprint != api_bp.name
+                    or profiling_requested()):
+                return None, None
+            response = cached_response()
+            if response is not None:
+                response = self.app.process_response(response)
+            return response, response_cache_key(negotiate_encoding())
+
+    def refused_response(self, environ: dict) -> Response:
+        """Creates response to a stream which is refused.
+
+        Args:
+            environ: WSGI environment of the request.
+
+        Returns:
+            Response object with 503 status and Retry-After header.
+        """
+        with self.app.request_context(environ):
+            error = Overloaded(retry_after=self.app.config["DB_RETRY_AFTER"])
+            response = self.app.make_response(self.app.handle_user_exception(error))
+            return self.app.process_response(response)
+
+    def handle(self, environ: dict) -> tuple[int, list[tuple[str, str]],
+                                             Optional[bytes], Optional[Iterator[bytes]]]:
+        """Handles request by the Flask application.
+
+        Runs in the pool thread.
+
+        Args:
+            environ: WSGI environment of the request.
+
+        Returns:
+            status, headers and either body or iterator over chunks of
+            streamed body.
+        """
+        started = []
+
+        def start_response(status: str, headers: list, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]), headers]
+
+        chunks = self.app(environ, start_response)
+        status, headers = started
+        # Bodies of streamed responses have no Content-Length.
+        if any(name.lower() == "content-length" for name, _ in headers):
+            try:
+                return status, headers, b"".join(chunks), None
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+        return status, headers, None, chunks
+
+
+def create_environ(scope: dict, body: bytes) -> dict:
+    """Creates WSGI environment from the connection scope.
+
+    Args:
+        scope: connection scope.
+        body: request body.
+
+    Returns:
+        WSGI environment.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {"REQUEST_METHOD": scope["method"],
+               "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+               "PATH_INFO": scope["path"].encode().decode("latin-1"),
+               "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+               "SERVER_NAME": server[0],
+               "SERVER_PORT": str(server[1]),
+               "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+               "REMOTE_ADDR": client[0],
+               "wsgi.version": (1, 0),
+               "wsgi.url_scheme": scope.get("scheme", "http"),
+               "wsgi.input": io.BytesIO(body),
+               "wsgi.errors": sys.stderr,
+               "wsgi.multithread": True,
+               "wsgi.multiprocess": False,
+               "wsgi.run_once": False}
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name == "content-length":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def send_start(send, status: int, headers):
+    """Sends status and headers of the response."""
+    await send({"type": "http.response.start",
+                "status": status,
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in headers]})
+
+
+async def stream_body(chunks: Iterator[bytes], receive, send, executor: ThreadPoolExecutor):
+    """Sends chunks of streamed body until it ends or client disconnects.
+
+    Chunks are read in one thread of the executor, as the context of
+    streamed response is pushed and popped by the same thread.
+
+    Args:
+        chunks: iterator over chunks of the body.
+        receive: function which receives request messages.
+        send: function which sends response messages.
+        executor: pool with a free thread for the stream.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=1)
+    stopped = threading.Event()
+
+    def read():
+        try:
+            for chunk in chunks:
+                if stopped.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+    reader = loop.run_in_executor(executor, read)
+    disconnected = asyncio.create_task(wait_for_disconnect(receive))
+    try:
+        while True:
+            chunk = asyncio.create_task(queue.get())
+            await asyncio.wait((chunk, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if not chunk.done():
+                # Client disconnected, reader stops after the current chunk.
+                chunk.cancel()
+                break
+            if chunk.result() is None:
+                await send({"type": "http.response.body", "body": b""})
+                break
+            await send({"type": "http.response.body", "body": chunk.result(), "more_body": True})
+    finally:
+        stopped.set()
+        disconnected.cancel()
+        # Reader is not blocked on the full queue.
+        while not reader.done():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                await asyncio.sleep(0.01)
+        await reader
+
+
+async def wait_for_disconnect(receive):
+    """Waits until client disconnects."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def create_asgi_app(config_name: str) -> AsyncApp:
+    """Creates ASGI application for async serving mode.
+
+    Args:
+        config_name: name of configuration.
+
+    Returns:
+        ASGI application.
+    """
+    app = create_app(config_name)
+    return AsyncApp(app,
+                    workers=app.config["DB_EXECUTOR_WORKERS"],
+                    streams=app.config["STREAM_EXECUTOR_WORKERS"])
@@ -0,0 +1,102 @@
+"""Module contains helper functions for compressing responses.
+
+Encoding is negotiated with Accept-Encoding header. Response bodies are
+compressed once per data version and stored in the cache with the headers,
+so repeated requests are served without querying and compressing again.
+"""
+import gzip
+import zlib
+from typing import Callable, Optional
+
+from flask import request, Response, g
+
+from app.extensions import cache
+from app.db.version import get_data_version
+from app.constants import IDENTITY_ENCODING, RESPONSE_CACHE_KEY, COMPRESSION_MIN_SIZE, \
+    GZIP_ENCODING, DEFLATE_ENCODING, ZSTD_ENCODING, NO_CACHE
+
+# Supported encodings in order of preference.
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {}
+
+try:
+    # zstd is a part of the standard library since Python 3.14.
+    from compression import zstd
+    ENCODERS[ZSTD_ENCODING] = zstd.compress
+except ImportError:
+    pass
+
+ENCODERS[GZIP_ENCODING] = lambda data: gzip.compress(data, compresslevel=9)
+ENCODERS[DEFLATE_ENCODING] = lambda data: zlib.compress(data, level=9)
+
+
+def negotiate_encoding() -> str:
+    """Chooses encoding of the response from Accept-Encoding header.
+
+    Returns:
+        the best supported encoding or identity if none is accepted.
+    """
+    return request.accept_encodings.best_match(list(ENCODERS), default=IDENTITY_ENCODING)
+
+
+def response_cache_key(encoding: str) -> str:
+    """Creates cache key of the response variant.
+
+    Args:
+        encoding: encoding of the response body.
+
+    Returns:
+        cache key of the request path with query string, encoding and data version.
+    """
+    return RESPONSE_CACHE_KEY.format(get_data_version(), encoding, request.full_path)
+
+
+def cached_response() -> Optional[Response]:
+    """Returns cached response variant for the request.
+
+    Used before request, if response is cached, the request is not handled by the view.
+
+    Returns:
+        Response object from the cache or None.
+    """
+    if request.method != "GET" or g.get(NO_CACHE):
+        return None
+
+    variant = cache.get(response_cache_key(negotiate_encoding()))
+    if variant is None:
+        return None
+
+    body, status, headers = variant
+    return Response(body, status=status, headers=headers)
+
+
+def compress_response(response: Response) -> Response:
+    """Compresses response body and stores it in the cache.
+
+    Used after request. Small, streamed, not successful and no-store
+    responses are neither compressed nor cached.
+
+    Args:
+        response: Response object created by the view.
+
+    Returns:
+        Response object with compressed body.
+    """
+    response.vary.add("Accept-Encoding")
+    if (request.method != "GET"
+            or response.status_code != 200
+            or response.is_streamed
+            or response.cache_control.no_store
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.content_length is None
+            or response.content_length < COMPRESSION_MIN_SIZE):
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding != IDENTITY_ENCODING:
+        response.set_data(ENCODERS[encoding](response.get_data()))
+        response.headers["Content-Encoding"] = encoding
+
+    cache.set(response_cache_key(encoding),
+              (response.get_data(), response.status_code, list(response.headers.items())))
+    return response
@@ -1,5 +1,4 @@
 """Module for constants"""
-from symbol import test
 
 # Constants for XML Response
 # Root element in xml.
@@ -12,6 +11,14 @@ ERROR_TAG = "error"
 ENCODING = "utf-8"
 # Mimetype
 APPLICATION_XML = "application/xml"
+TEXT_CSV = "text/csv"
+
+# Constants for bulk Response
+# Keys of columnar json: {"columns": [...], "rows": [[...]]}.
+COLUMNS_KEY = "columns"
+ROWS_KEY = "rows"
+# Number of rows written to csv stream at once.
+CSV_CHUNK_SIZE = 1000
 
 # Parameters in a request.
 # Order parameter.
@@ -22,11 +29,87 @@ DESC_ORDER = "desc"
 FORMAT_PARAMETER = "format"
 # Value of format parameter.
 XML_FORMAT = "xml"
+# Formats for bulk consumers, generated directly from the query cursor.
+CSV_FORMAT = "csv"
+COLUMNS_FORMAT = "columns"
+BULK_FORMATS = (CSV_FORMAT, COLUMNS_FORMAT)
+# Filter parameters.
+# Team name.
+TEAM_PARAMETER = "team"
+# Minimum and maximum lap time, inclusive.
+LAP_MIN_PARAMETER = "lap_min"
+LAP_MAX_PARAMETER = "lap_max"
+# Prefix of driver's surname.
+NAME_PREFIX_PARAMETER = "name_prefix"
+# Season parameter, archived season of the race.
+SEASON_PARAMETER = "season"
+# Since parameter, data version after which changed results are returned.
+SINCE_PARAMETER = "since"
+# Fields parameter, comma separated list of fields to return.
+FIELDS_PARAMETER = "fields"
+# Separator of values in fields parameter.
+FIELDS_SEPARATOR = ","
+
+# Response compression.
+# Values of Accept-Encoding and Content-Encoding headers.
+IDENTITY_ENCODING = "identity"
+GZIP_ENCODING = "gzip"
+DEFLATE_ENCODING = "deflate"
+ZSTD_ENCODING = "zstd"
+# Responses smaller than this size in bytes are not compressed.
+COMPRESSION_MIN_SIZE = 500
+
+# Cache keys.
+DATA_VERSION_KEY = "data_version"
+# Formatted with data version, encoding and request path.
+RESPONSE_CACHE_KEY = "response:{}:{}:{}"
+# Formatted with data version, model, method and arguments.
+QUERY_CACHE_KEY = "query:{}:{}.{}:{!r}"
+
+# Requests which are cached after database is filled.
+WARM_UP_PATHS = ("/api/v1/report/", "/api/v1/report/drivers/")
+WARM_UP_QUERIES = ("", "order=desc", "format=xml", "order=desc&format=xml")
+WARM_UP_ENCODINGS = (IDENTITY_ENCODING, GZIP_ENCODING)
+
+# Profiling of requests.
+# Parameter and header which enable profiling of the request.
+PROFILE_PARAMETER = "profile"
+PROFILE_HEADER = "X-Profile"
+ENABLED_VALUES = ("1", "true")
+# Headers with profile summary.
+PROFILE_FILE_HEADER = "X-Profile-File"
+PROFILE_PEAK_MEMORY_HEADER = "X-Profile-Peak-Memory"
+PROFILE_TIME_HEADER = "X-Profile-Time"
+# Number of top allocations in profile summary.
+PROFILE_TOP_ALLOCATIONS = 10
+
+# Names in flask.g.
+# Profiler of the request.
+PROFILER = "profiler"
+# Caches are not read for the request.
+NO_CACHE = "no_cache"
+
+# Live leaderboard stream.
+# Event with current standings, sent first.
+STANDINGS_EVENT = "standings"
+# Event with place changes.
+PLACES_EVENT = "places"
+# Maximum number of events waiting for subscriber.
+STREAM_QUEUE_SIZE = 100
+# Seconds between keep-alive comments.
+STREAM_KEEPALIVE = 15
+TEXT_EVENT_STREAM = "text/event-stream"
+
+# Header with seconds after which shed request can be retried.
+RETRY_AFTER_HEADER = "Retry-After"
 
 # Path to API documentation.
 REPORT_DOC = "./static/docs/report.yml"
 DRIVERS_DOC = "./static/docs/drivers.yml"
 SINGLE_DRIVER_DOC = "./static/docs/single_driver.yml"
+DRIVER_HISTORY_DOC = "./static/docs/driver_history.yml"
+REPORT_STREAM_DOC = "./static/docs/report_stream.yml"
+METRICS_DOC = "./static/docs/metrics.yml"
 
 # Path to log files.
 ABBREVIATIONS = "data/abbreviations.txt"
@@ -44,7 +127,27 @@ SURNAME = "surname"
 
 # Alias and additional columns.
 PLACE = "place"
+VERSION = "version"
+SEASON = "season"
 TEAM_ALIAS = "team"
+# Fields of driver's rank, read from the leaderboard index.
+GAP = "gap"
+AHEAD = "ahead"
+BEHIND = "behind"
+RANK_FIELDS = (PLACE, GAP, AHEAD, BEHIND)
+
+# Fields which can be requested with fields parameter.
+REPORT_FIELDS = (ID, NAME, SURNAME, TEAM_ALIAS, LAP_TIME, PLACE)
+DRIVERS_FIELDS = (ID, NAME, SURNAME)
+SINGLE_DRIVER_FIELDS = (ID, NAME, SURNAME, TEAM_ALIAS, LAP_TIME) + RANK_FIELDS
+# Fields of driver's result in every season.
+HISTORY_FIELDS = (SEASON, TEAM_ALIAS, LAP_TIME, PLACE)
+# Fields of standings in the stream.
+STREAM_FIELDS = (PLACE, ID, NAME, SURNAME, TEAM_ALIAS, LAP_TIME)
+# Fields returned when fields parameter is not provided.
+REPORT_DEFAULT_FIELDS = (NAME, SURNAME, TEAM_ALIAS, LAP_TIME, PLACE)
+DRIVERS_DEFAULT_FIELDS = DRIVERS_FIELDS
+SINGLE_DRIVER_DEFAULT_FIELDS = SINGLE_DRIVER_FIELDS
 
 # Reference in models
 TEAM = "team"
@@ -56,6 +159,12 @@ DATETIME_STRING = "%Y-%m-%d_%H:%M:%S.%f"
 
 # Error messages
 DRIVER_NOT_FOUND = "A driver with the '%s' ID  was not found."
+UNKNOWN_FIELDS = "Unknown fields: {}. Allowed fields: {}."
+INVALID_VERSION = "Version should be a non-negative integer, got '{}'."
+SINCE_NOT_SUPPORTED = "Changes since version are returned only in json or xml format, got '{}'."
+SEASON_NOT_FOUND = "A season '{}' was not found. Archived seasons: {}."
+INVALID_LAP_TIME = "Lap time should be in 'minutes:seconds.milliseconds' format, got '{}'."
+SERVICE_OVERLOADED = "The service is overloaded. Please retry later."
 INTERNAL_ERROR = "There is an error in the application. Please contact the administrator."
 
 # Logging
@@ -0,0 +1,125 @@
+"""Module for admission control of database queries.
+
+Only DB_MAX_CONCURRENCY queries run at once, at most DB_MAX_QUEUE queries
+wait for a free slot. Queries which can not be queued or waited longer than
+DB_QUEUE_TIMEOUT seconds are shed with 503 Service Unavailable.
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, ContextManager, Iterator
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+
+from app.constants import SERVICE_OVERLOADED
+
+
+class Overloaded(ServiceUnavailable):
+    """Raised when a query is shed, contains Retry-After seconds"""
+    description = SERVICE_OVERLOADED
+
+
+class Admission:
+    """Limits number of concurrently running queries with bounded wait queue"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        # Queries which are running.
+        self.active = 0
+        # Queries which are waiting for a free slot.
+        self.waiting = 0
+        # Total number of admitted and shed queries.
+        self.admitted = 0
+        self.shed = 0
+
+    @contextmanager
+    def admit(self, max_concurrency: int, max_queue: int,
+              timeout: float, retry_after: int) -> Iterator[None]:
+        """Holds a slot while the query runs.
+
+        Args:
+            max_concurrency: maximum number of running queries.
+            max_queue: maximum number of waiting queries.
+            timeout: seconds to wait for a free slot.
+            retry_after: seconds after which shed request can be retried.
+
+        Exceptions:
+            Overloaded: if the queue is full or the wait timed out.
+        """
+        with self.condition:
+            if self.active >= max_concurrency:
+                if self.waiting >= max_queue:
+                    self.shed += 1
+                    raise Overloaded(retry_after=retry_after)
+                self.waiting += 1
+                try:
+                    admitted = self.condition.wait_for(
+                        lambda: self.active < max_concurrency, timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.shed += 1
+                    raise Overloaded(retry_after=retry_after)
+            self.active += 1
+            self.admitted += 1
+
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify()
+
+    def metrics(self) -> dict:
+        """Returns current state and counters.
+
+        Returns:
+            dictionary with active, waiting, admitted and shed queries.
+        """
+        with self.condition:
+            return {"active": self.active,
+                    "waiting": self.waiting,
+                    "admitted": self.admitted,
+                    "shed": self.shed}
+
+
+# Admission of queries in the process.
+admission = Admission()
+
+
+def admit() -> ContextManager[None]:
+    """Holds a slot of the process admission with limits from the configuration.
+
+    Returns:
+        context manager which holds the slot.
+
+    Exceptions:
+        Overloaded: if the queue is full or the wait timed out.
+    """
+    config = current_app.config
+    return admission.admit(max_concurrency=config["DB_MAX_CONCURRENCY"],
+                           max_queue=config["DB_MAX_QUEUE"],
+                           timeout=config["DB_QUEUE_TIMEOUT"],
+                           retry_after=config["DB_RETRY_AFTER"])
+
+
+def admitted(func: Callable) -> Callable:
+    """Runs model class method only when it is admitted.
+
+    Should be applied under cached_query decorator, so cached results
+    do not take a slot.
+
+    Args:
+        func: function which runs query.
+
+    Returns:
+        decorated function.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with admit():
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,164 @@
+"""Module for caching of model queries.
+
+Cached values are served fresh for CACHE_DEFAULT_TIMEOUT seconds and stale
+for CACHE_STALE_TIMEOUT seconds more, while they are refreshed in background.
+On a cache miss only one query per key is run in the process, other requests
+wait for its result instead of running the same query.
+"""
+import inspect
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from flask import current_app, g, has_app_context
+
+from app.extensions import db_wrapper, cache
+from app.db.version import get_data_version
+from app.constants import QUERY_CACHE_KEY, NO_CACHE
+from config import CACHE_CONFIG
+
+
+class Flight:
+    """Represents query which is running for a cache key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[Exception] = None
+
+
+# Queries which are running in the process by cache key.
+flights: dict[str, Flight] = {}
+flights_lock = threading.Lock()
+
+
+def single_flight(key: str, query: Callable[[], Any]) -> Any:
+    """Runs query once for concurrent calls with the same key and caches result.
+
+    Args:
+        key: cache key.
+        query: function which runs query.
+
+    Returns:
+        result of the query.
+
+    Exceptions:
+        Exception raised by the query is raised for all waiting calls.
+    """
+    with flights_lock:
+        flight = flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = flights[key] = Flight()
+
+    if leader:
+        return run_flight(key, flight, query)
+    flight.done.wait()
+    if flight.error is not None:
+        raise flight.error
+    return flight.value
+
+
+def run_flight(key: str, flight: Flight, query: Callable[[], Any]) -> Any:
+    """Runs query of the flight registered for the key and caches result.
+
+    Args:
+        key: cache key.
+        flight: flight registered in flights for the key.
+        query: function which runs query.
+
+    Returns:
+        result of the query.
+
+    Exceptions:
+        Exception raised by the query.
+    """
+    try:
+        flight.value = query()
+        fresh_until = time.monotonic() + CACHE_CONFIG["CACHE_DEFAULT_TIMEOUT"]
+        # Value is kept in the cache while it can be served as stale.
+        cache.set(key, (flight.value, fresh_until),
+                  timeout=CACHE_CONFIG["CACHE_DEFAULT_TIMEOUT"] + CACHE_CONFIG["CACHE_STALE_TIMEOUT"])
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with flights_lock:
+            del flights[key]
+        flight.done.set()
+
+    return flight.value
+
+
+def refresh_in_background(key: str, query: Callable[[], Any]):
+    """Refreshes stale cached value in a background thread.
+
+    The refresh is registered before the thread is started, so requests
+    which get the stale value while it is refreshed start no threads.
+
+    Args:
+        key: cache key.
+        query: function which runs query.
+    """
+    with flights_lock:
+        if key in flights:
+            return
+        flight = flights[key] = Flight()
+    app = current_app._get_current_object()
+
+    def refresh_query():
+        with db_wrapper.database.connection_context():
+            return query()
+
+    def refresh():
+        try:
+            with app.app_context():
+                run_flight(key, flight, refresh_query)
+        except Exception:
+            # Stale value is served until the next refresh.
+            app.logger.exception("Refresh of '%s' failed.", key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def cached_query(func: Callable) -> Callable:
+    """Caches result of model class method by its arguments and data version.
+
+    Should be applied under classmethod decorator.
+
+    Args:
+        func: function which runs query.
+
+    Returns:
+        decorated function.
+    """
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(cls, *args, **kwargs):
+        # Cache is bypassed, e.g. when request is profiled.
+        if has_app_context() and g.get(NO_CACHE):
+            return func(cls, *args, **kwargs)
+
+        # Arguments are bound, so positional and keyword calls share the key.
+        arguments = signature.bind(cls, *args, **kwargs)
+        arguments.apply_defaults()
+        key = QUERY_CACHE_KEY.format(get_data_version(),
+                                     cls.__name__,
+                                     func.__name__,
+                                     tuple(arguments.arguments.values())[1:])
+
+        def query():
+            return func(cls, *args, **kwargs)
+
+        cached = cache.get(key)
+        if cached is None:
+            return single_flight(key, query)
+
+        value, fresh_until = cached
+        if time.monotonic() > fresh_until:
+            refresh_in_background(key, query)
+        return value
+
+    return wrapper
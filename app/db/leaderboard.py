@@ -0,0 +1,114 @@
+"""Module for leaderboard index.
+
+Results are kept sorted in the order of places, so place of a driver is
+found with binary search instead of reading the full report. The index is
+loaded once per data version and updated in place when a lap is added.
+"""
+import threading
+from bisect import bisect_left, insort
+from datetime import timedelta
+from typing import Iterable, NamedTuple, Optional
+
+
+class Entry(NamedTuple):
+    """Represents result in the leaderboard.
+
+    Entries are ordered as places: by lap time, then by result id.
+    """
+    lap: timedelta
+    result_id: int
+    driver_id: str
+    lap_time: str
+
+
+class Rank(NamedTuple):
+    """Represents place of a driver and the drivers next to the driver"""
+    place: int
+    gap: timedelta
+    leader: Entry
+    ahead: Optional[Entry]
+    behind: Optional[Entry]
+
+
+class Leaderboard:
+    """Sorted results with lookup of place by driver id"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: list[Entry] = []
+        self.by_driver: dict[str, Entry] = {}
+        # Data version of the loaded results.
+        self.version: Optional[int] = None
+
+    def is_loaded(self, version: int) -> bool:
+        """Checks results of the data version are loaded.
+
+        Args:
+            version: data version.
+
+        Returns:
+            True if the index can be used for the data version.
+        """
+        return self.version == version
+
+    def load(self, entries: Iterable[Entry], version: int):
+        """Replaces results in the index.
+
+        Args:
+            entries: all results.
+            version: data version of the results.
+        """
+        entries = sorted(entries)
+        with self.lock:
+            self.entries = entries
+            self.by_driver = {entry.driver_id: entry for entry in entries}
+            self.version = version
+
+    def update(self, entry: Entry, previous_version: int, version: int):
+        """Replaces result of the driver.
+
+        Index which is not loaded for the previous data version is left
+        as it is, it is loaded again on the next lookup.
+
+        Args:
+            entry: new result of the driver.
+            previous_version: data version before the result was changed.
+            version: data version after the result was changed.
+        """
+        with self.lock:
+            if self.version != previous_version:
+                return
+            old = self.by_driver.get(entry.driver_id)
+            if old is not None:
+                del self.entries[bisect_left(self.entries, old)]
+            insort(self.entries, entry)
+            self.by_driver[entry.driver_id] = entry
+            self.version = version
+
+    def rank(self, driver_id: str) -> Optional[Rank]:
+        """Finds place of the driver.
+
+        Args:
+            driver_id: driver's id.
+
+        Returns:
+            place, gap to the leader, the leader and the drivers immediately
+            ahead and behind, or None if the driver has no result.
+        """
+        with self.lock:
+            entry = self.by_driver.get(driver_id)
+            if entry is None:
+                return None
+            index = bisect_left(self.entries, entry)
+            leader = self.entries[0]
+            return Rank(place=index + 1,
+                        gap=entry.lap - leader.lap,
+                        leader=leader,
+                        ahead=self.entries[index - 1] if index > 0 else None,
+                        behind=self.entries[index + 1] if index + 1 < len(self.entries) else None)
+
+
+# Leaderboard of the current season in the process.
+leaderboard = Leaderboard()
+# Leaderboards of archived seasons by season.
+archived_leaderboards: dict[str, Leaderboard] = {}
@@ -1,32 +1,94 @@
 """Module for Models"""
-from typing import Optional
+from datetime import timedelta
+from functools import reduce
+from operator import add, itemgetter
+from typing import Optional, Iterator, NamedTuple
 
-from peewee import AutoField, CharField, ForeignKeyField, DateTimeField
+from flask import current_app
+from peewee import AutoField, CharField, ForeignKeyField, DateTimeField, IntegerField, \
+    Field, Select, Node, Ordering, Table, Value, fn
 
-from app.extensions import db_wrapper, cache
-from app.constants import DESC_ORDER, PLACE, TEAM_ALIAS, TEAM, RESULT, DRIVER
+from app.extensions import db_wrapper
+from app.db.caching import cached_query
+from app.db.admission import admitted
+from app.db.leaderboard import Leaderboard, Entry, leaderboard, archived_leaderboards
+from app.db.shards import SCHEMA_PREFIX, MAX_ATTACHED
+from app.db.version import get_data_version
+from app.utils import format_lap_time
+from app.constants import DESC_ORDER, PLACE, TEAM_ALIAS, TEAM, RESULT, DRIVER, ID, NAME, \
+    SURNAME, LAP_TIME, VERSION, ROWS_KEY, REPORT_DEFAULT_FIELDS, DRIVERS_DEFAULT_FIELDS, \
+    SINGLE_DRIVER_DEFAULT_FIELDS, GAP, AHEAD, BEHIND, RANK_FIELDS, SEASON
+
+
+class Filters(NamedTuple):
+    """Represents filters of report and drivers.
+
+    Every filter is supported by an index.
+    """
+    # Team name.
+    team: Optional[str] = None
+    # Minimum and maximum lap time in milliseconds, inclusive.
+    lap_min: Optional[int] = None
+    lap_max: Optional[int] = None
+    # Prefix of driver's surname, case-sensitive.
+    name_prefix: Optional[str] = None
+
+    def filters_laps(self) -> bool:
+        """Checks lap time filter is set, so results should be joined."""
+        return self.lap_min is not None or self.lap_max is not None
+
+    def apply(self, query: Select) -> Select:
+        """Adds conditions of filters to the query.
+
+        Tables of filtered columns should be joined in the query.
+
+        Args:
+            query: query to filter.
+
+        Returns:
+            filtered query.
+        """
+        if self.team is not None:
+            query = query.where(Team.name == self.team.upper())
+        if self.lap_min is not None:
+            query = query.where(Result.lap_ms >= self.lap_min)
+        if self.lap_max is not None:
+            query = query.where(Result.lap_ms <= self.lap_max)
+        if self.name_prefix:
+            # Range instead of LIKE, so index on surname is used.
+            upper_bound = self.name_prefix[:-1] + chr(ord(self.name_prefix[-1]) + 1)
+            query = query.where((Driver.surname >= self.name_prefix)
+                                & (Driver.surname < upper_bound))
+        return query
 
 
 class Team(db_wrapper.Model):
     """Represents Team table in database"""
     id = AutoField(primary_key=True)
-    name = CharField(null=False)
+    name = CharField(null=False, index=True)
 
 
 class Driver(db_wrapper.Model):
     """Represents Driver table in database"""
     id = CharField(primary_key=True)
     name = CharField(null=False)
-    surname = CharField(null=False)
+    surname = CharField(null=False, index=True)
     team_id = ForeignKeyField(Team, backref=DRIVER)
 
     @classmethod
-    @cache.cached(query_string=True)
-    def get_drivers(cls, order: Optional[str]) -> list[dict]:
+    @cached_query
+    @admitted
+    def get_drivers(cls, order: Optional[str],
+                    fields: tuple[str, ...] = DRIVERS_DEFAULT_FIELDS,
+                    filters: Filters = Filters(),
+                    season: Optional[str] = None) -> list[dict]:
         """Gets drivers.
 
         Args:
             order: order in which drivers list should be return.
+            fields: fields of driver which should be selected.
+            filters: filters of drivers.
+            season: archived season or None for the current season.
 
         Returns:
             list of drivers ordered by driver id in asc or desc order.
@@ -34,26 +96,72 @@ class Driver(db_wrapper.Model):
         Example:
             [{"id": "BHS", "name": "Brendon", "surname": "Hartley"}]
         """
-        # Prepare query for selecting drivers.
-        query = cls.select(cls.id,
-                           cls.name,
-                           cls.surname).order_by(cls.id).dicts()
-
         # Prepare list of drivers.
-        drivers = [driver for driver in query]
-        # Reverse list of drivers if order is desc.
-        if order == DESC_ORDER:
-            drivers.reverse()
+        with db_wrapper.database.season(season):
+            query = cls.drivers_query(order, fields, filters)
+            return [dict(zip(fields, row)) for row in query.tuples()]
+
+    @classmethod
+    def iter_drivers(cls, order: Optional[str],
+                     fields: tuple[str, ...] = DRIVERS_DEFAULT_FIELDS,
+                     filters: Filters = Filters(),
+                     season: Optional[str] = None) -> Iterator[tuple]:
+        """Iterates over drivers directly from the query cursor.
+
+        Used for bulk formats, rows are neither cached nor kept in memory.
+
+        Args:
+            order: order in which drivers should be return.
+            fields: fields of driver which should be selected.
+            filters: filters of drivers.
+            season: archived season or None for the current season.
 
-        return drivers
+        Yields:
+            rows with values in the order of fields.
+
+        Example:
+            ("BHS", "Brendon", "Hartley")
+        """
+        # Query is executed on the first iteration, which can happen after the
+        # request is torn down for streamed responses, so the iterator manages
+        # its own connection.
+        with db_wrapper.database.season(season), db_wrapper.database.connection_context():
+            yield from cls.drivers_query(order, fields, filters).tuples().iterator()
 
     @classmethod
-    @cache.cached(query_string=True)
-    def get_single_driver(cls, driver_id: str) -> dict:
+    def drivers_query(cls, order: Optional[str], fields: tuple[str, ...],
+                      filters: Filters) -> Select:
+        """Prepares query for selecting drivers.
+
+        Args:
+            order: order in which drivers should be return.
+            fields: fields of driver which should be selected.
+            filters: filters of drivers.
+
+        Returns:
+            query ordered by driver id in asc or desc order.
+        """
+        query = cls.select(*get_columns(fields))
+        # Join only tables which columns are filtered.
+        if filters.team is not None:
+            query = query.join_from(cls, Team)
+        if filters.filters_laps():
+            query = query.join_from(cls, Result)
+
+        return filters.apply(query).order_by(*get_ordering(cls.id, order=order))
+
+    @classmethod
+    @cached_query
+    @admitted
+    def get_single_driver(cls, driver_id: str,
+                          fields: tuple[str, ...] = SINGLE_DRIVER_DEFAULT_FIELDS,
+                          season: Optional[str] = None) -> dict:
         """Gets drivers.
 
         Args:
             driver_id: driver's id.
+            fields: fields of driver which should be selected.
+            season: archived season or None for the current season.
 
         Returns:
             driver object.
@@ -66,42 +174,101 @@ class Driver(db_wrapper.Model):
              "name": "Brendon",
              "surname": "Hartley",
              "team": "FERRARI",
-             "lap_time": "1:12:123}
+             "lap_time": "1:12:123",
+             "place": 2,
+             "gap": "0:00.321",
+             "ahead": {"place": 1, "id": "SVF", "name": "Sebastian",
+                       "surname": "Vettel", "lap_time": "1:11.802", "gap": "0:00.000"},
+             "behind": None}
         """
+        # Rank fields are read from the leaderboard index.
+        columns = tuple(field for field in fields if field not in RANK_FIELDS)
         # Prepare query for selecting information about driver.
-        query = (cls
-                 .select(cls.id,
-                         cls.name,
-                         cls.surname,
-                         Team.name.alias(TEAM_ALIAS),
-                         Result.lap_time)
-                 .join(Team)
-                 .where(cls.id == driver_id.upper())
-                 .switch(cls)
-                 .join(Result)
-                 .order_by(Result.lap_time)).dicts()
-        # Check driver with specific id exists.
-        if not query.exists():
-            raise UserWarning
+        query = cls.select(*get_columns(columns) or [cls.id]).where(cls.id == driver_id.upper())
+        # Join only tables which columns are requested.
+        if TEAM_ALIAS in columns:
+            query = query.join_from(cls, Team)
+        if LAP_TIME in columns:
+            query = query.join_from(cls, Result).order_by(Result.lap_ms)
+
+        with db_wrapper.database.season(season):
+            row = query.dicts().first()
+            # Check driver with specific id exists.
+            if row is None:
+                raise UserWarning
+
+            driver = {field: row[field] for field in columns}
+            if columns != fields:
+                driver.update(get_rank(driver_id.upper(), fields, season))
+        return {field: driver[field] for field in fields}
+
+    @classmethod
+    @cached_query
+    @admitted
+    def get_history(cls, driver_id: str) -> list[dict]:
+        """Gets results of the driver in every season.
+
+        Archived shards are attached in batches of MAX_ATTACHED shards on a
+        dedicated connection, results of a batch are selected with one query.
 
-        return query.get()
+        Args:
+            driver_id: driver's id.
+
+        Returns:
+            results ordered by season.
+
+        Exceptions:
+            UserWarning: If driver with specific id has no results.
+
+        Example:
+            [{"season": "2017", "team": "FERRARI", "lap_time": "1:12.123", "place": 2},
+             {"season": "2018", "team": "FERRARI", "lap_time": "1:04.415", "place": 1}]
+        """
+        driver_id = driver_id.upper()
+        query = season_results_query(driver_id, current_app.config["SEASON"])
+        history = list(query.dicts().execute(db_wrapper.database))
+        seasons = db_wrapper.database.seasons()
+        for start in range(0, len(seasons), MAX_ATTACHED):
+            batch = seasons[start:start + MAX_ATTACHED]
+            with db_wrapper.database.attached(batch) as database:
+                query = reduce(add, [season_results_query(driver_id, season, SCHEMA_PREFIX + season)
+                                     for season in batch])
+                history.extend(query.dicts().execute(database))
+        # Check driver with specific id has results.
+        if not history:
+            raise UserWarning
+        return sorted(history, key=itemgetter(SEASON))
 
 
 class Result(db_wrapper.Model):
     """Represents Result table in database"""
     id = AutoField(primary_key=True)
     lap_time = CharField(null=False)
+    # Lap time in milliseconds, laps are compared and ordered by it,
+    # as minutes of lap time are not zero-padded.
+    lap_ms = IntegerField(null=False, index=True)
     start_time = DateTimeField(null=False)
     end_time = DateTimeField(null=False)
     driver_id = ForeignKeyField(Driver, backref=RESULT)
+    # Place is precomputed when database is filled.
+    place = IntegerField(null=True, index=True)
+    # Data version in which place or lap time was changed.
+    version = IntegerField(null=False, default=0, index=True)
 
     @classmethod
-    @cache.cached(query_string=True)
-    def get_report(cls, order: Optional[str]) -> list[dict]:
+    @cached_query
+    @admitted
+    def get_report(cls, order: Optional[str],
+                   fields: tuple[str, ...] = REPORT_DEFAULT_FIELDS,
+                   filters: Filters = Filters(),
+                   season: Optional[str] = None) -> list[dict]:
         """Gets drivers.
 
         Args:
             order: order in which results should be return.
+            fields: fields of report which should be selected.
+            filters: filters of results.
+            season: archived season or None for the current season.
 
         Returns:
             list of results ordered by place in asc or desc order.
@@ -113,27 +280,242 @@ class Result(db_wrapper.Model):
               "lap_time": "1:12:123,
               "place": 1}]
         """
-        # Prepare query for selecting results.
+        # Create report in the order of requested fields.
+        with db_wrapper.database.season(season):
+            query = cls.report_query(order, fields, filters)
+            return [dict(zip(fields, row)) for row in query.tuples()]
+
+    @classmethod
+    @cached_query
+    @admitted
+    def get_report_changes(cls, since: int, order: Optional[str],
+                           fields: tuple[str, ...] = REPORT_DEFAULT_FIELDS,
+                           filters: Filters = Filters(),
+                           season: Optional[str] = None) -> dict:
+        """Gets results which place or lap time changed since data version.
+
+        Args:
+            since: data version of the client.
+            order: order in which results should be return.
+            fields: fields of report which should be selected.
+            filters: filters of results.
+            season: archived season or None for the current season.
+
+        Returns:
+            current data version and changed results ordered by place
+            in asc or desc order.
+
+        Example:
+            {"version": 3,
+             "rows": [{"name": "Brendon",
+                       "surname": "Hartley",
+                       "team": "FERRARI",
+                       "lap_time": "1:12:123,
+                       "place": 1}]}
+        """
+        query = cls.changes_query(since, order, fields, filters)
+        with db_wrapper.database.season(season):
+            version = cls.select(fn.MAX(cls.version)).scalar() or 0
+            return {VERSION: version,
+                    ROWS_KEY: [dict(zip(fields, row)) for row in query.tuples()]}
+
+    @classmethod
+    def iter_report(cls, order: Optional[str],
+                    fields: tuple[str, ...] = REPORT_DEFAULT_FIELDS,
+                    filters: Filters = Filters(),
+                    season: Optional[str] = None) -> Iterator[tuple]:
+        """Iterates over results directly from the query cursor.
+
+        Used for bulk formats, rows are neither cached nor kept in memory.
+
+        Args:
+            order: order in which results should be return.
+            fields: fields of report which should be selected.
+            filters: filters of results.
+            season: archived season or None for the current season.
+
+        Yields:
+            rows with values in the order of fields.
+
+        Example:
+            ("Brendon", "Hartley", "FERRARI", "1:12:123", 1)
+        """
+        # Query is executed on the first iteration, which can happen after the
+        # request is torn down for streamed responses, so the iterator manages
+        # its own connection.
+        with db_wrapper.database.season(season), db_wrapper.database.connection_context():
+            yield from cls.report_query(order, fields, filters).tuples().iterator()
+
+    @classmethod
+    def changes_query(cls, since: int, order: Optional[str], fields: tuple[str, ...],
+                      filters: Filters) -> Select:
+        """Prepares query for selecting results changed since data version.
+
+        Args:
+            since: data version of the client.
+            order: order in which results should be return.
+            fields: fields of report which should be selected.
+            filters: filters of results.
+
+        Returns:
+            query ordered by place in asc or desc order.
+        """
+        # Changed results are found with index on version in a subquery,
+        # otherwise all results are scanned in the order of places.
+        changed = cls.select(cls.id).where(cls.version > since)
+        return cls.report_query(order, fields, filters).where(cls.id.in_(changed))
+
+    @classmethod
+    def report_query(cls, order: Optional[str], fields: tuple[str, ...],
+                     filters: Filters) -> Select:
+        """Prepares query for selecting results.
+
+        Place is precomputed, so rows are read from the cursor in the order
+        of the place index.
+
+        Args:
+            order: order in which results should be return.
+            fields: fields of report which should be selected.
+            filters: filters of results.
+
+        Returns:
+            query ordered by place in asc or desc order.
+        """
         query = (Driver
-                 .select(Driver.name,
-                         Driver.surname,
-                         Team.name.alias(TEAM_ALIAS),
-                         cls.lap_time)
-                 .join_from(Driver, Team)  # Join driver with team.
-                 .join_from(Driver, cls)  # Join driver with result.
-                 .order_by(cls.lap_time)).dicts()
-
-        results = []
-        # Create report from query and adding drivers place.
-        for place, driver in enumerate(query, start=1):
-            driver[PLACE] = place
-            results.append(driver)
-
-        # Reverse list of results if order is desc.
-        if order == DESC_ORDER:
-            results.reverse()
-
-        return results
+                 .select(*get_columns(fields))
+                 .join_from(Driver, cls))  # Join driver with result.
+        # Join driver with team only if team is requested or filtered.
+        if TEAM_ALIAS in fields or filters.team is not None:
+            query = query.join_from(Driver, Team)
+
+        # Places are ordered as lap times, so results filtered by lap time
+        # are ordered by the same index which is used for the filter.
+        ordering = (cls.lap_ms, cls.id) if filters.filters_laps() else (cls.place,)
+        return filters.apply(query).order_by(*get_ordering(*ordering, order=order))
+
+    @classmethod
+    def get_leaderboard(cls, season: Optional[str] = None) -> Leaderboard:
+        """Gets leaderboard index of the current data version.
+
+        Results are loaded to the index only if it was not loaded or updated
+        for the current data version. Should be called in the context of
+        the season's route.
+
+        Args:
+            season: archived season or None for the current season.
+
+        Returns:
+            leaderboard index.
+        """
+        version = get_data_version()
+        index = leaderboard if season is None else archived_leaderboards.setdefault(season, Leaderboard())
+        if not index.is_loaded(version):
+            query = cls.select(cls.lap_ms, cls.id, cls.driver_id, cls.lap_time)
+            index.load((Entry(timedelta(milliseconds=lap_ms), result_id, driver_id, lap_time)
+                        for lap_ms, result_id, driver_id, lap_time in query.tuples()),
+                       version)
+        return index
+
+
+def get_rank(driver_id: str, fields: tuple[str, ...], season: Optional[str] = None) -> dict:
+    """Gets place, gap to the leader and the drivers ahead and behind.
+
+    Args:
+        driver_id: driver's id.
+        fields: requested fields, only rank fields are returned.
+        season: archived season or None for the current season.
+
+    Returns:
+        rank fields of the driver, values are None if driver has no result.
+    """
+    rank = Result.get_leaderboard(season).rank(driver_id)
+    if rank is None:
+        return {field: None for field in fields if field in RANK_FIELDS}
+
+    # Names of the drivers ahead and behind are selected by primary key.
+    neighbours = [entry.driver_id for entry in (rank.ahead, rank.behind) if entry is not None]
+    names = {}
+    if AHEAD in fields or BEHIND in fields:
+        names = {row[0]: row[1:] for row in
+                 Driver
+                 .select(Driver.id, Driver.name, Driver.surname)
+                 .where(Driver.id.in_(neighbours))
+                 .tuples()}
+
+    def neighbour(entry: Optional[Entry], place: int) -> Optional[dict]:
+        """Represents driver ahead or behind."""
+        if entry is None:
+            return None
+        name, surname = names[entry.driver_id]
+        return {PLACE: place,
+                ID: entry.driver_id,
+                NAME: name,
+                SURNAME: surname,
+                LAP_TIME: entry.lap_time,
+                GAP: format_lap_time(entry.lap - rank.leader.lap)}
+
+    values = {PLACE: rank.place,
+              GAP: format_lap_time(rank.gap),
+              AHEAD: neighbour(rank.ahead, rank.place - 1) if AHEAD in fields else None,
+              BEHIND: neighbour(rank.behind, rank.place + 1) if BEHIND in fields else None}
+    return {field: values[field] for field in fields if field in RANK_FIELDS}
+
+
+def season_results_query(driver_id: str, season: str, schema: Optional[str] = None) -> Select:
+    """Prepares query for selecting result of the driver in the shard.
+
+    Args:
+        driver_id: driver's id.
+        season: season of the shard.
+        schema: schema of attached shard or None for the current shard.
+
+    Returns:
+        query of season, team, lap time and place.
+    """
+    driver = Table(Driver._meta.table_name, schema=schema)
+    team = Table(Team._meta.table_name, schema=schema)
+    result = Table(Result._meta.table_name, schema=schema)
+    return (driver
+            .select(Value(season).alias(SEASON),
+                    team.c.name.alias(TEAM_ALIAS),
+                    result.c.lap_time.alias(LAP_TIME),
+                    result.c.place.alias(PLACE))
+            .join(result, on=(result.c.driver_id == driver.c.id))
+            .join(team, on=(team.c.id == driver.c.team_id))
+            .where(driver.c.id == driver_id))
+
+
+def get_columns(fields: tuple[str, ...]) -> list[Node]:
+    """Maps requested fields to the columns which should be selected.
+
+    Args:
+        fields: requested fields.
+
+    Returns:
+        list of columns in the order of fields.
+    """
+    columns = {ID: Driver.id,
+               NAME: Driver.name,
+               SURNAME: Driver.surname,
+               TEAM_ALIAS: Team.name.alias(TEAM_ALIAS),
+               LAP_TIME: Result.lap_time,
+               PLACE: Result.place}
+    return [columns[field] for field in fields]
+
+
+def get_ordering(*columns: Field, order: Optional[str]) -> list[Ordering]:
+    """Orders columns in asc or desc order.
+
+    Args:
+        columns: columns to order by.
+        order: asc or desc order.
+
+    Returns:
+        list of ordered columns.
+    """
+    if order == DESC_ORDER:
+        return [column.desc() for column in columns]
+    return [column.asc() for column in columns]
 
 
 def get_models():
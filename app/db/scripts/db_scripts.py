@@ -1,36 +1,259 @@
 """Module contains scripts for creating database
  and filling it with data from log files."""
 
-from datetime import datetime
-
-from typing import Union
+import mmap
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import product
+from multiprocessing import get_context
+
+from typing import Union, Optional, Iterable
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from peewee import SqliteDatabase, fn
 
 from app.extensions import db_wrapper
 from app.constants import ABBREVIATIONS, START_LOG, END_LOG, LAP_TIME, END_TIME, \
-    START_TIME, SURNAME, NAME, ID, TEAM_ID, DATETIME_STRING
+    START_TIME, SURNAME, NAME, ID, TEAM_ID, DATETIME_STRING, WARM_UP_PATHS, WARM_UP_QUERIES, \
+    WARM_UP_ENCODINGS, PLACE
 from app.db.models import Team, Driver, Result, get_models
+from app.utils import format_lap_time, lap_milliseconds
+from app.db.version import get_data_version, bump_data_version, remember_snapshot, \
+    detect_snapshot_swap
+from app.db.leaderboard import Entry, leaderboard
+from app.db.shards import SEASON_PATTERN, shard_path
+from app.stream import broadcaster, get_standings, publish_place_changes, publish_swapped_changes
+
+# Suffix of database snapshot file while it is built.
+SNAPSHOT_SUFFIX = ".snapshot"
 
-# Integers are used to format lap time string.
-TRAILING_ZEROS = 3
-LEADING_ZEROS = -3
+# Log files larger than this size in bytes are parsed in parallel.
+PARALLEL_PARSE_MIN_SIZE = 64 * 1024 * 1024
+# Approximate size in bytes of a log part parsed by one worker at once.
+PARSE_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Thread which warms up the cache in the process, None if it is not running.
+warm_up_thread: Optional[threading.Thread] = None
+# Data changed while the cache was warmed up, so it is warmed up again.
+warm_up_pending = False
+warm_up_lock = threading.Lock()
 
 
 def create_tables():
     """Create and prepare database.
 
     When application is lunched for the first time, database and tables should
-    be created and filed with data from log files.
+    be created and filed with data from log files. Database is also rebuilt
+    if its schema doesn't match models. Cache is warmed up after the database
+    is ready.
     """
-    # Get models in dictionary.
-    models = get_models()
     with db_wrapper.database.connection_context():
-        tables = db_wrapper.database.get_tables()
-        # Check if db has tables.
-        if not tables:
-            # Create tables from models.
-            db_wrapper.database.create_tables(models.values())
-            # Fill database with data from log files.
+        outdated = is_outdated()
+
+    if outdated:
+        reload_database()
+    else:
+        remember_snapshot()
+
+    warm_up_cache()
+
+
+def is_outdated() -> bool:
+    """Checks database has tables, columns and indexes of all models.
+
+    Returns:
+        True if some table, column or index is missing.
+    """
+    tables = db_wrapper.database.get_tables()
+    for model in get_models().values():
+        table = model._meta.table_name
+        if table not in tables:
+            return True
+        columns = {column.name for column in db_wrapper.database.get_columns(table)}
+        if not {field.column_name for field in model._meta.sorted_fields} <= columns:
+            return True
+        indexes = {index.name for index in db_wrapper.database.get_indexes(table)}
+        if not {index._name for index in model._meta.fields_to_index()} <= indexes:
+            return True
+    return False
+
+
+def reload_database():
+    """Reloads data without downtime.
+
+    New database snapshot is built in a separate file, so the serving
+    database is never half-loaded and readers are not blocked by writes.
+    Then the snapshot atomically replaces the serving database file. Connections opened after that read the new snapshot, connections
+    which are already open finish on the previous one.
+    """
+    path = db_wrapper.database.database
+    snapshot_path = f"{path}.{uuid.uuid4().hex}{SNAPSHOT_SUFFIX}"
+    # Results are read from the previous snapshot to stream place changes
+    # and to keep versions of results which are not changed.
+    with db_wrapper.database.connection_context():
+        outdated = is_outdated()
+        before = None if outdated else get_standings()
+        previous = {} if outdated else get_result_versions()
+    try:
+        build_snapshot(snapshot_path, previous)
+        os.replace(snapshot_path, path)
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+    # Connection of this thread is reopened to the new snapshot.
+    if not db_wrapper.database.is_closed():
+        db_wrapper.database.close()
+    remember_snapshot()
+    # Responses cached for previous data are outdated.
+    bump_data_version()
+    with db_wrapper.database.connection_context():
+        publish_place_changes(before)
+
+
+def build_snapshot(path: str, previous: dict[str, tuple[int, str, int]]):
+    """Creates database file with tables, indexes and data.
+
+    Queries of models in this thread are routed to the new file, other
+    threads keep serving the current database.
+
+    Args:
+        path: path to the database file.
+        previous: results of the previous snapshot, from get_result_versions.
+    """
+    database = SqliteDatabase(path)
+    with db_wrapper.database.route(database), database.connection_context():
+        # Create tables and indexes from models.
+        database.create_tables(get_models().values())
+        with database.atomic():
             fill_database_with_data()
+            tag_versions(previous)
+
+
+@click.command("reload-data")
+@with_appcontext
+def reload_data_command():
+    """Reloads data from log files without downtime."""
+    reload_database()
+    click.echo(f"Database '{db_wrapper.database.database}' is reloaded.")
+
+
+def archive_season(season: Optional[str] = None) -> str:
+    """Copies the database to the shard of the season in SHARD_DIR.
+
+    Copy is written with VACUUM INTO, so it is consistent and compact,
+    and replaces the previous shard of the season atomically. Shard is
+    discovered by applications which are started after that.
+
+    Args:
+        season: season of the shard, current SEASON by default.
+
+    Returns:
+        path to the shard.
+
+    Exceptions:
+        ValueError: If the season can not be a name of a shard.
+    """
+    season = season or current_app.config["SEASON"]
+    if not SEASON_PATTERN.fullmatch(season):
+        raise ValueError(f"Season '{season}' should contain only letters, digits and '_'.")
+    directory = current_app.config["SHARD_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    path = shard_path(directory, season)
+    snapshot_path = f"{path}.{uuid.uuid4().hex}{SNAPSHOT_SUFFIX}"
+    try:
+        with db_wrapper.database.connection_context():
+            db_wrapper.database.execute_sql("VACUUM INTO ?", (snapshot_path,))
+        os.replace(snapshot_path, path)
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+    return path
+
+
+@click.command("archive-season")
+@click.argument("season", required=False)
+@with_appcontext
+def archive_season_command(season: Optional[str]):
+    """Archives results of the season to a separate shard."""
+    path = archive_season(season)
+    click.echo(f"Season is archived to '{path}'.")
+
+
+def warm_up_cache():
+    """Caches common requests.
+
+    Requests are made with every combination of path, query and encoding,
+    so both query results and responses are cached before the first client
+    request and clients don't miss the cache at the same time after start.
+    """
+    client = current_app.test_client()
+    for path, query, encoding in product(WARM_UP_PATHS, WARM_UP_QUERIES, WARM_UP_ENCODINGS):
+        client.get(path, query_string=query, headers={"Accept-Encoding": encoding})
+
+
+def warm_up_in_background():
+    """Caches common requests for new data in a background thread.
+
+    Used after data is changed, so clients don't miss the cache at the same
+    time after ingest. Only one thread warms up the cache in the process,
+    data changed while it runs is warmed up by the same thread again.
+    """
+    global warm_up_thread, warm_up_pending
+    app = current_app._get_current_object()
+
+    def warm_up():
+        global warm_up_thread, warm_up_pending
+        while True:
+            with warm_up_lock:
+                if not warm_up_pending:
+                    warm_up_thread = None
+                    return
+                warm_up_pending = False
+            with app.app_context():
+                try:
+                    warm_up_cache()
+                except Exception:
+                    # Requests of clients fill the cache instead.
+                    app.logger.exception("Warm up of the cache failed.")
+
+    with warm_up_lock:
+        warm_up_pending = True
+        if warm_up_thread is None:
+            warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            warm_up_thread.start()
+
+
+def wait_for_warm_up():
+    """Waits until the cache is warmed up in background."""
+    thread = warm_up_thread
+    if thread is not None:
+        thread.join()
+
+
+def handle_snapshot_swap():
+    """Sends place changes and warms up the cache if database was reloaded
+    by another process.
+
+    Used before request instead of detect_snapshot_swap. Changes are
+    queried in a background thread, so the request is not delayed.
+    """
+    if not detect_snapshot_swap():
+        return
+    if broadcaster.has_subscribers():
+        app = current_app._get_current_object()
+
+        def publish():
+            with app.app_context(), db_wrapper.database.connection_context():
+                publish_swapped_changes()
+
+        threading.Thread(target=publish, name="place-changes", daemon=True).start()
+    warm_up_in_background()
 
 
 def data_from_abbreviation(path: str):
@@ -98,42 +321,116 @@ def data_from_logs(start_log, end_log):
                  "end_time": "2018-05-24 12:06:28.100",
                  "lap_time": 1:14:000"}}
     """
-    results = {}
-    # Open start log file.
-    with open(start_log, encoding="utf8") as file:
-        for line in file:
-            line = line.strip()
-            if line:
-                # First three chars in the line is abbreviation - key,
-                # rest is 1st qualification start time or end time of the lap
-                driver_id = line[:3]
-                start_time = datetime.strptime(line[3:].strip(), "%Y-%m-%d_%H:%M:%S.%f")
-
-                # Add new key-value pair to dictionary of results,
-                # where key is driver id and value is dictionary with start time.
-                results[driver_id] = {START_TIME: start_time}
+    # Add new key-value pair to dictionary of results,
+    # where key is driver id and value is dictionary with start time.
+    results = {driver_id: {START_TIME: start_time}
+               for driver_id, start_time in read_log(start_log).items()}
 
-    # Open end log file.
-    with open(end_log, encoding="utf8") as file:
-        for line in file:
-            line = line.strip()
-            if line:
-                # First three chars in the line is abbreviation - key,
-                # rest is 1st qualification start time or end time of the lap
-                driver_id = line[:3]
-                end_time = datetime.strptime(line[3:].strip(), DATETIME_STRING)
-
-                # Add end time to the dictionary of specific driver
-                results[driver_id][END_TIME] = end_time
-                # Count driver's lap time in string format. Example: 2:12:831
-                lap_time = str(results[driver_id][END_TIME] - results[driver_id][START_TIME])[
-                           TRAILING_ZEROS: LEADING_ZEROS]
-                # Add lap time to the dictionary of specific driver
-                results[driver_id][LAP_TIME] = lap_time
+    for driver_id, end_time in read_log(end_log).items():
+        # Add end time to the dictionary of specific driver
+        results[driver_id][END_TIME] = end_time
+        # Add lap time to the dictionary of specific driver
+        results[driver_id][LAP_TIME] = format_lap_time(end_time - results[driver_id][START_TIME])
 
     return results
 
 
+def read_log(path: str,
+             workers: Optional[int] = None,
+             min_size: int = PARALLEL_PARSE_MIN_SIZE,
+             chunk_size: int = PARSE_CHUNK_SIZE) -> dict[str, datetime]:
+    """Read time of every driver from log file.
+
+    Large files are memory-mapped, split into byte ranges at newline
+    boundaries and parsed in parallel worker processes. Results of ranges
+    are merged in file order, so the last time of the driver wins as with
+    sequential reading.
+
+    Args:
+        path: path to log file.
+        workers: number of worker processes, number of CPUs by default.
+        min_size: files smaller than this size in bytes are read sequentially.
+        chunk_size: approximate size of byte range in bytes.
+
+    Returns:
+        dictionary where key is driver id and value is time from the log.
+
+    Example:
+        {"BHS": datetime(2018, 5, 24, 12, 5, 14, 100000)}
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    if workers == 1 or size == 0 or size < min_size:
+        with open(path, encoding="utf8") as file:
+            return parse_log_lines(file)
+
+    ranges = split_log(path, chunk_size)
+    times = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)),
+                             mp_context=get_context("spawn")) as executor:
+        # Results are returned in the order of ranges.
+        for range_times in executor.map(parse_log_range, *zip(*ranges)):
+            times.update(range_times)
+    return times
+
+
+def split_log(path: str, chunk_size: int) -> list[tuple[str, int, int]]:
+    """Split log file into byte ranges at newline boundaries.
+
+    Args:
+        path: path to log file.
+        chunk_size: approximate size of byte range in bytes.
+
+    Returns:
+        list of path, start and end of every byte range.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        size = len(log)
+        ranges = []
+        start = 0
+        while start < size:
+            # Range ends after the first newline following the chunk size.
+            newline = log.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if newline == -1 else newline + 1
+            ranges.append((path, start, end))
+            start = end
+    return ranges
+
+
+def parse_log_range(path: str, start: int, end: int) -> dict[str, datetime]:
+    """Parse byte range of log file in worker process.
+
+    Args:
+        path: path to log file.
+        start: start of the range.
+        end: end of the range, it is after newline or at the end of file.
+
+    Returns:
+        dictionary where key is driver id and value is time from the log.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        return parse_log_lines(log[start:end].decode("utf8").splitlines())
+
+
+def parse_log_lines(lines: Iterable[str]) -> dict[str, datetime]:
+    """Parse lines of log file.
+
+    Args:
+        lines: lines of log file.
+
+    Returns:
+        dictionary where key is driver id and value is time from the log.
+    """
+    times = {}
+    for line in lines:
+        line = line.strip()
+        if line:
+            # First three chars in the line is abbreviation - key,
+            # rest is 1st qualification start time or end time of the lap
+            times[line[:3]] = datetime.strptime(line[3:].strip(), DATETIME_STRING)
+    return times
+
+
 def add_data_to_team_table(teams: dict[str: int]):
     """Adds data to Team table
 
@@ -167,9 +464,109 @@ def add_data_to_result_table(results: dict[str: dict[str: str]]):
         Result.create(start_time=result[START_TIME],
                       end_time=result[END_TIME],
                       lap_time=result[LAP_TIME],
+                      lap_ms=lap_milliseconds(result[END_TIME] - result[START_TIME]),
                       driver_id=driver_id)
 
 
+def add_lap(driver_id: str, start_time: datetime, end_time: datetime) -> bool:
+    """Adds lap of driver to Result table during the session.
+
+    Driver's result is the best lap. Places and the leaderboard index are
+    updated and place changes are sent to subscribers of the live
+    leaderboard stream.
+
+    Args:
+        driver_id: driver's id.
+        start_time: start time of the lap.
+        end_time: end time of the lap.
+
+    Returns:
+        True if the lap is the best lap of the driver.
+
+    Exceptions:
+        UserWarning: If driver with specific id doesn't exist.
+    """
+    with db_wrapper.database.connection_context():
+        if Driver.get_or_none(Driver.id == driver_id) is None:
+            raise UserWarning
+
+        before = get_standings()
+        previous = get_result_versions()
+        previous_version = get_data_version()
+        lap = end_time - start_time
+        with db_wrapper.database.atomic():
+            result = Result.get_or_none(Result.driver_id == driver_id)
+            if result is not None and result.end_time - result.start_time <= lap:
+                return False
+            if result is None:
+                result = Result(driver_id=driver_id)
+            result.start_time = start_time
+            result.end_time = end_time
+            result.lap_time = format_lap_time(lap)
+            result.lap_ms = lap_milliseconds(lap)
+            result.save()
+            update_places()
+            tag_versions(previous)
+
+        # Responses cached for previous data are outdated.
+        version = bump_data_version()
+        leaderboard.update(Entry(timedelta(milliseconds=result.lap_ms), result.id, driver_id,
+                                 result.lap_time),
+                           previous_version=previous_version,
+                           version=version)
+        publish_place_changes(before)
+    warm_up_in_background()
+    return True
+
+
+def update_places():
+    """Updates place of every result in Result table.
+
+    Results are ordered by lap time, results with the same lap time by id.
+    """
+    ranked = (Result
+              .select(Result.id,
+                      fn.ROW_NUMBER().over(order_by=[Result.lap_ms, Result.id]).alias(PLACE))
+              .alias("ranked"))
+    (Result
+     .update(place=ranked.c.place)
+     .from_(ranked)
+     .where(Result.id == ranked.c.id)
+     .execute())
+
+
+def get_result_versions() -> dict[str, tuple[int, str, int]]:
+    """Gets place, lap time and version of every result.
+
+    Returns:
+        dictionary where key is driver id and value is place, lap time and version.
+    """
+    query = Result.select(Result.driver_id, Result.place, Result.lap_time, Result.version).tuples()
+    return {driver_id: (place, lap_time, version) for driver_id, place, lap_time, version in query}
+
+
+def tag_versions(previous: dict[str, tuple[int, str, int]]):
+    """Tags results with data version.
+
+    Results which place or lap time changed since previous data get a new
+    version, other results keep their version.
+
+    Args:
+        previous: results before ingest, from get_result_versions.
+    """
+    new_version = max((version for _, _, version in previous.values()), default=0) + 1
+    versions = {}
+    for driver_id, (place, lap_time, version) in get_result_versions().items():
+        before = previous.get(driver_id)
+        changed = before is None or before[:2] != (place, lap_time)
+        tagged = new_version if changed else before[2]
+        if tagged != version:
+            versions.setdefault(tagged, []).append(driver_id)
+
+    for version, driver_ids in versions.items():
+        Result.update(version=version).where(Result.driver_id.in_(driver_ids)).execute()
+
+
 def fill_database_with_data():
     """Data-to-Database control function.
 
@@ -186,3 +583,5 @@ def fill_database_with_data():
     results = data_from_logs(start_log=START_LOG, end_log=END_LOG)
     # Add data to the table.
     add_data_to_result_table(results)
+    # Precompute report.
+    update_places()
@@ -0,0 +1,162 @@
+"""Module for partitioning of results into per-season shards.
+
+Results of the current SEASON are stored in DATABASE, which is filled from
+log files and receives laps. Results of previous seasons are archived to
+SHARD_DIR/<season>.db files, which are only read. Models are bound to the
+router, so a per-race query is run on the shard of the requested season.
+A cross-season query is run on a dedicated connection with archived shards
+attached as season_<season> schemas, at most MAX_ATTACHED shards at once, as
+SQLite limits the number of attached databases. Shards are discovered at
+startup.
+"""
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from peewee import DatabaseProxy, SqliteDatabase, Database
+
+# File extension of shards in SHARD_DIR.
+SHARD_EXTENSION = ".db"
+# Prefix of schema of attached shard.
+SCHEMA_PREFIX = "season_"
+# Season is a part of file and schema names.
+SEASON_PATTERN = re.compile(r"[0-9A-Za-z_]+")
+# Maximum number of databases attached to a connection by default in SQLite.
+MAX_ATTACHED = 10
+
+
+class ShardRouter(DatabaseProxy):
+    """Proxy of the database which sends queries to the shard of a season.
+
+    Initialized database is the shard of the current season, queries are
+    run on it unless another season is routed.
+    """
+    # Router keeps its own state, unlike other proxies.
+    __setattr__ = object.__setattr__
+
+    def __init__(self):
+        # Archived shards by season.
+        self.shards: dict[str, Database] = {}
+        # Shard of the season routed in the context.
+        self.routed: ContextVar[Optional[Database]] = ContextVar("routed", default=None)
+        super().__init__()
+
+    def current(self) -> Database:
+        """Gets shard which queries are run on.
+
+        Returns:
+            routed shard or the shard of the current season.
+        """
+        database = self.routed.get() or self.obj
+        if database is None:
+            raise AttributeError("Cannot use uninitialized Proxy.")
+        return database
+
+    def __getattr__(self, attr):
+        return getattr(self.current(), attr)
+
+    def __enter__(self):
+        return self.current().__enter__()
+
+    def __exit__(self, *args):
+        return self.current().__exit__(*args)
+
+    def init_app(self, app):
+        """Discovers archived shards in SHARD_DIR.
+
+        Shard of the current season is never archived.
+
+        Args:
+            app: Flask instance.
+        """
+        self.shards = {}
+
+        directory = app.config["SHARD_DIR"]
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            season, extension = os.path.splitext(name)
+            if (extension != SHARD_EXTENSION
+                    or not SEASON_PATTERN.fullmatch(season)
+                    or season == app.config["SEASON"]):
+                continue
+            path = os.path.abspath(os.path.join(directory, name))
+            # Archived shards are opened read-only.
+            self.shards[season] = SqliteDatabase(f"file:{path}?mode=ro", uri=True)
+
+    def seasons(self) -> list[str]:
+        """Gets archived seasons.
+
+        Returns:
+            seasons in ascending order.
+        """
+        return sorted(self.shards)
+
+    @contextmanager
+    def season(self, season: Optional[str]) -> Iterator[None]:
+        """Routes queries in the context to the shard of the season.
+
+        Args:
+            season: archived season or None for the current season.
+
+        Exceptions:
+            UserWarning: If the season is not archived.
+        """
+        if season is None:
+            yield
+            return
+        if season not in self.shards:
+            raise UserWarning
+        database = self.shards[season]
+        with self.route(database), database.connection_context():
+            yield
+
+    @contextmanager
+    def route(self, database: Database) -> Iterator[None]:
+        """Routes queries of models in the context to the database.
+
+        Args:
+            database: database which queries are run on.
+        """
+        token = self.routed.set(database)
+        try:
+            yield
+        finally:
+            self.routed.reset(token)
+
+    @contextmanager
+    def attached(self, seasons: list[str]) -> Iterator[Database]:
+        """Opens dedicated connection with archived shards of the seasons attached.
+
+        Args:
+            seasons: at most MAX_ATTACHED archived seasons.
+
+        Yields:
+            database in which shards are season_<season> schemas.
+
+        Exceptions:
+            ValueError: If more than MAX_ATTACHED seasons are requested.
+        """
+        if len(seasons) > MAX_ATTACHED:
+            raise ValueError(f"At most {MAX_ATTACHED} shards can be attached.")
+        # Attached shards are opened read-only with their URIs.
+        database = SqliteDatabase(":memory:", uri=True)
+        for season in seasons:
+            database.attach(self.shards[season].database, SCHEMA_PREFIX + season)
+        with database.connection_context():
+            yield database
+
+
+def shard_path(directory: str, season: str) -> str:
+    """Gets path to the shard of the season.
+
+    Args:
+        directory: directory of shards.
+        season: season.
+
+    Returns:
+        path to the shard file.
+    """
+    return os.path.join(directory, season + SHARD_EXTENSION)
@@ -0,0 +1,79 @@
+"""Module for version of data in database.
+
+Data version is a part of the cache keys of responses, so responses cached
+for previous data are never served after the database is filled again or
+replaced with a new snapshot.
+"""
+import os
+import time
+from typing import Optional
+
+from app.extensions import db_wrapper, cache
+from app.constants import DATA_VERSION_KEY
+
+
+def get_data_version() -> int:
+    """Gets current data version.
+
+    Returns:
+        data version, new version is created if it is not in the cache.
+    """
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        version = bump_data_version()
+    return version
+
+
+def bump_data_version() -> int:
+    """Creates new data version.
+
+    Version is based on the current time, so it is never repeated even if
+    the previous version was evicted from the cache.
+
+    Returns:
+        new data version.
+    """
+    version = time.time_ns()
+    # Data version should never expire.
+    cache.set(DATA_VERSION_KEY, version, timeout=0)
+    return version
+
+
+# Identity of the database file which is served by the process.
+snapshot = None
+
+
+def remember_snapshot():
+    """Remembers identity of the served database file."""
+    global snapshot
+    snapshot = get_snapshot()
+
+
+def get_snapshot() -> Optional[tuple[int, int]]:
+    """Gets identity of the served database file.
+
+    Returns:
+        device and inode of the database file or None for in-memory database.
+    """
+    try:
+        stat = os.stat(db_wrapper.database.database)
+    except (OSError, TypeError):
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def detect_snapshot_swap() -> bool:
+    """Creates new data version if database file was replaced.
+
+    Used before request, so cached responses are not served after the
+    database is reloaded by another process.
+
+    Returns:
+        True if database file was replaced.
+    """
+    current = get_snapshot()
+    if current == snapshot:
+        return False
+    remember_snapshot()
+    bump_data_version()
+    return True
@@ -4,7 +4,10 @@ from playhouse.flask_utils import FlaskDB
 from flask_caching import Cache
 
 from app.static.docs.swagger import template
+from app.db.shards import ShardRouter
 
 db_wrapper = FlaskDB()
+# Models are bound to the router, which sends queries to the shard of a season.
+db_wrapper.database = ShardRouter()
 cache = Cache()
 swagger = Swagger(template=template)
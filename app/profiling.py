@@ -0,0 +1,151 @@
+"""Module for on-demand profiling of API requests.
+
+When PROFILING is enabled in configuration, a request with profile=1
+parameter or X-Profile: 1 header is run under cProfile and tracemalloc.
+Caches are bypassed, so the profile covers the route, the model query and
+serialization. Profile is stored to PROFILE_DIR with a json summary of the
+peak memory and top allocations, and the summary is returned in headers.
+"""
+import cProfile
+import glob
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+
+import click
+from flask import request, Response, current_app, g
+from flask.cli import with_appcontext
+
+from app.constants import PROFILE_PARAMETER, PROFILE_HEADER, PROFILER, NO_CACHE, \
+    PROFILE_FILE_HEADER, PROFILE_PEAK_MEMORY_HEADER, PROFILE_TIME_HEADER, \
+    PROFILE_TOP_ALLOCATIONS, ENABLED_VALUES
+
+# Only one request is profiled at a time, as profilers are process wide.
+profiling_lock = threading.Lock()
+
+
+def profiling_requested() -> bool:
+    """Checks profiling is enabled and requested for the request.
+
+    Returns:
+        True if the request should be profiled.
+    """
+    if not current_app.config.get("PROFILING"):
+        return False
+    return (request.args.get(PROFILE_PARAMETER) in ENABLED_VALUES
+            or request.headers.get(PROFILE_HEADER) in ENABLED_VALUES)
+
+
+def start_profiling():
+    """Starts profiling of the request if it is requested and enabled.
+
+    Used before request.
+    """
+    if not profiling_requested():
+        return
+    # Request is not profiled if another request is being profiled.
+    if not profiling_lock.acquire(blocking=False):
+        current_app.logger.info("Profiling of %s is skipped, profiler is busy.", request.full_path)
+        return
+
+    # Caches are bypassed, so the query and serialization are profiled.
+    setattr(g, NO_CACHE, True)
+    profiler = cProfile.Profile()
+    setattr(g, PROFILER, (profiler, time.perf_counter()))
+    tracemalloc.start()
+    profiler.enable()
+
+
+def stop_profiling(response: Response) -> Response:
+    """Stops profiling of the request and stores the profile.
+
+    Used after request.
+
+    Args:
+        response: Response object created by the view.
+
+    Returns:
+        Response object with profile summary in headers.
+    """
+    profiler, started = g.pop(PROFILER, (None, None))
+    if profiler is None:
+        return response
+
+    try:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        allocations = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]
+    finally:
+        tracemalloc.stop()
+        profiling_lock.release()
+
+    directory = current_app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(os.path.join(directory, f"{name}.prof"))
+    summary = {"path": request.full_path,
+               "endpoint": request.endpoint,
+               "time": elapsed,
+               "peak_memory": peak,
+               "top_allocations": [{"line": str(stat.traceback), "size": stat.size, "count": stat.count}
+                                   for stat in allocations]}
+    with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf8") as file:
+        json.dump(summary, file, indent=2)
+
+    response.headers[PROFILE_FILE_HEADER] = f"{name}.prof"
+    response.headers[PROFILE_PEAK_MEMORY_HEADER] = str(peak)
+    response.headers[PROFILE_TIME_HEADER] = f"{elapsed:.6f}"
+    return response
+
+
+def cancel_profiling(exc):
+    """Stops profiling if request failed before the profile was stored.
+
+    Used on request teardown.
+    """
+    profiler, _ = g.pop(PROFILER, (None, None))
+    if profiler is not None:
+        profiler.disable()
+        tracemalloc.stop()
+        profiling_lock.release()
+
+
+@click.command("profiles")
+@click.option("--directory", default=None, help="Directory with profiles, PROFILE_DIR by default.")
+@click.option("--endpoint", default=None, help="Aggregate profiles of this endpoint only.")
+@click.option("--sort", default="cumulative", show_default=True, help="pstats sort key.")
+@click.option("--limit", default=30, show_default=True, help="Number of functions to print.")
+@with_appcontext
+def profiles_command(directory, endpoint, sort, limit):
+    """Aggregates stored profiles of requests."""
+    directory = directory or current_app.config["PROFILE_DIR"]
+    summaries = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf8") as file:
+            summary = json.load(file)
+        if endpoint is None or summary["endpoint"] == endpoint:
+            summaries.append((path[:-len(".json")] + ".prof", summary))
+
+    profiles = [path for path, _ in summaries if os.path.exists(path)]
+    if not profiles:
+        click.echo(f"No profiles found in '{directory}'.")
+        return
+
+    # Memory and time summary per endpoint.
+    endpoints = {}
+    for _, summary in summaries:
+        endpoints.setdefault(summary["endpoint"], []).append(summary)
+    click.echo(f"{'endpoint':<30} {'requests':>8} {'avg time, ms':>13} {'max peak, KiB':>14}")
+    for name, items in sorted(endpoints.items()):
+        average = sum(item["time"] for item in items) / len(items) * 1000
+        peak = max(item["peak_memory"] for item in items) / 1024
+        click.echo(f"{name:<30} {len(items):>8} {average:>13.2f} {peak:>14.1f}")
+    click.echo()
+
+    stats = pstats.Stats(*profiles)
+    stats.sort_stats(sort).print_stats(limit)
@@ -0,0 +1,173 @@
+"""Module for live leaderboard stream.
+
+Subscribers of Server-Sent Events stream share one broadcaster. When laps
+are ingested, place changes are calculated once and the same encoded event
+is put into the queue of every subscriber, so the work doesn't depend on
+the size of the report for every client.
+"""
+import json
+import queue
+import threading
+from typing import Iterator, Optional
+
+from app.db.models import Result
+from app.constants import ID, PLACE, LAP_TIME, PLACES_EVENT, STANDINGS_EVENT, \
+    STREAM_QUEUE_SIZE, STREAM_KEEPALIVE
+
+
+class Subscriber:
+    """Represents client of the stream"""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        # Subscriber which doesn't read events is dropped,
+        # client reconnects and gets current standings.
+        self.lagging = False
+
+
+class Broadcaster:
+    """Fan-out of events to all subscribers"""
+
+    def __init__(self):
+        self.subscribers: set[Subscriber] = set()
+        self.lock = threading.Lock()
+        # Standings which subscribers have, changes are calculated against them
+        # when the database is reloaded by another process.
+        self.standings: Optional[dict[str, tuple[int, str]]] = None
+        self.standings_lock = threading.Lock()
+
+    def has_subscribers(self) -> bool:
+        """Checks the stream has subscribers."""
+        return bool(self.subscribers)
+
+    def subscribe(self) -> Subscriber:
+        """Adds subscriber.
+
+        Returns:
+            new subscriber.
+        """
+        subscriber = Subscriber()
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Removes subscriber.
+
+        Args:
+            subscriber: subscriber to remove.
+        """
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: object):
+        """Sends event to all subscribers.
+
+        Event is encoded once for all subscribers.
+
+        Args:
+            event: event name.
+            data: event data, which is encoded to json.
+        """
+        message = format_event(event, data)
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                subscriber.lagging = True
+                self.unsubscribe(subscriber)
+
+
+broadcaster = Broadcaster()
+
+
+def format_event(event: str, data: object) -> str:
+    """Formats Server-Sent Event.
+
+    Args:
+        event: event name.
+        data: event data, which is encoded to json.
+
+    Returns:
+        event in text/event-stream format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def get_standings() -> Optional[dict[str, tuple[int, str]]]:
+    """Gets place and lap time of every driver if stream has subscribers.
+
+    Returns:
+        dictionary where key is driver id and value is place and lap time,
+        None if stream has no subscribers.
+    """
+    if not broadcaster.has_subscribers():
+        return None
+    query = Result.select(Result.driver_id, Result.place, Result.lap_time).tuples()
+    return {driver_id: (place, lap_time) for driver_id, place, lap_time in query}
+
+
+def publish_place_changes(before: Optional[dict[str, tuple[int, str]]]):
+    """Sends place changes to subscribers.
+
+    Args:
+        before: standings before ingest, from get_standings.
+
+    Example of event data:
+        [{"id": "SVF", "place": 2, "lap_time": "1:04.415"}]
+    """
+    after = get_standings()
+    if after is not None:
+        broadcaster.standings = after
+    if before is None or after is None:
+        return
+
+    changes = [{ID: driver_id, PLACE: place, LAP_TIME: lap_time}
+               for driver_id, (place, lap_time) in after.items()
+               if before.get(driver_id) != (place, lap_time)]
+    if changes:
+        broadcaster.publish(PLACES_EVENT, sorted(changes, key=lambda change: change[PLACE]))
+
+
+def publish_swapped_changes():
+    """Sends place changes since the standings which subscribers have.
+
+    Used when the database is reloaded by another process, which can not
+    send events to subscribers of this process.
+    """
+    with broadcaster.standings_lock:
+        publish_place_changes(broadcaster.standings)
+
+
+def remember_standings(standings: list[dict]):
+    """Remembers standings which are sent to a new subscriber.
+
+    Args:
+        standings: rows with id, place and lap time.
+    """
+    with broadcaster.standings_lock:
+        broadcaster.standings = {row[ID]: (row[PLACE], row[LAP_TIME]) for row in standings}
+
+
+def stream_events(subscriber: Subscriber, standings: list[dict]) -> Iterator[str]:
+    """Generates events for subscriber.
+
+    Args:
+        subscriber: subscriber of the stream.
+        standings: current standings which are sent first.
+
+    Yields:
+        events in text/event-stream format.
+    """
+    try:
+        yield format_event(STANDINGS_EVENT, standings)
+        while not subscriber.lagging:
+            try:
+                yield subscriber.queue.get(timeout=STREAM_KEEPALIVE)
+            except queue.Empty:
+                # Comment keeps connection open through proxies.
+                yield ": keep-alive\n\n"
+    finally:
+        broadcaster.unsubscribe(subscriber)
@@ -1,11 +1,120 @@
-"""Module contains helper functions for creating Response in xml or json format"""
-
-from typing import Union, Optional
-from flask import request, Response, jsonify
+"""Module contains helper functions for parsing request parameters
+and creating Response in xml or json format"""
+
+import csv
+import io
+import re
+from datetime import timedelta
+from itertools import islice
+from typing import Union, Optional, Iterator
+from flask import request, Response, jsonify, abort, stream_with_context
 import xml.etree.ElementTree as ET
 
 from app.constants import FORMAT_PARAMETER, XML_FORMAT, DRIVER_TAG, ENCODING,\
-    ERROR_TAG, APPLICATION_XML
+    ERROR_TAG, APPLICATION_XML, FIELDS_SEPARATOR, UNKNOWN_FIELDS, CSV_FORMAT, TEXT_CSV, \
+    COLUMNS_KEY, ROWS_KEY, CSV_CHUNK_SIZE, INVALID_VERSION, INVALID_LAP_TIME
+from app.db.admission import admit
+
+# Lap time in request: minutes, seconds and optional milliseconds.
+LAP_TIME_PATTERN = re.compile(r"(\d+):([0-5]\d)(?:\.(\d{1,3}))?")
+
+
+def parse_fields(fields: Optional[str],
+                 allowed: tuple[str, ...],
+                 default: tuple[str, ...]) -> tuple[str, ...]:
+    """Parse value of fields parameter.
+
+    Args:
+        fields: comma separated list of fields from the request.
+        allowed: fields which can be requested.
+        default: fields returned when fields parameter is not provided.
+
+    Returns:
+        requested fields without duplicates in the order of the request.
+
+    Exceptions:
+        HTTPException: 400 if some of requested fields are not allowed.
+
+    Example:
+        parse_fields("place,id", REPORT_FIELDS, REPORT_DEFAULT_FIELDS)
+        ("place", "id")
+    """
+    if not fields:
+        return default
+
+    # Strip spaces and drop empty values: "place, id," -> ("place", "id").
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(FIELDS_SEPARATOR)
+                                    if field.strip()))
+    unknown = [field for field in requested if field not in allowed]
+    if unknown or not requested:
+        abort(400, description=UNKNOWN_FIELDS.format(", ".join(unknown), ", ".join(allowed)))
+
+    return requested
+
+
+def parse_version(version: str) -> int:
+    """Parse value of since parameter.
+
+    Args:
+        version: data version from the request.
+
+    Returns:
+        data version.
+
+    Exceptions:
+        HTTPException: 400 if version is not a non-negative integer.
+    """
+    if not version.isdigit():
+        abort(400, description=INVALID_VERSION.format(version))
+    return int(version)
+
+
+def lap_milliseconds(lap: timedelta) -> int:
+    """Converts lap time to milliseconds.
+
+    Args:
+        lap: lap time.
+
+    Returns:
+        lap time in whole milliseconds, microseconds are truncated.
+    """
+    return lap // timedelta(milliseconds=1)
+
+
+def format_lap_time(lap: timedelta) -> str:
+    """Formats lap time.
+
+    Args:
+        lap: lap time.
+
+    Returns:
+        lap time in string format. Example: 2:12.831
+    """
+    minutes, milliseconds = divmod(lap_milliseconds(lap), 60 * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{minutes}:{seconds:02d}.{milliseconds:03d}"
+
+
+def parse_lap_time(lap_time: str) -> int:
+    """Parse lap time from the request.
+
+    Args:
+        lap_time: lap time in "minutes:seconds.milliseconds" format,
+            milliseconds are optional. Example: 1:12.5
+
+    Returns:
+        lap time in milliseconds, as it is compared in database. Example: 72500
+
+    Exceptions:
+        HTTPException: 400 if lap time has wrong format.
+    """
+    match = LAP_TIME_PATTERN.fullmatch(lap_time)
+    if match is None:
+        abort(400, description=INVALID_LAP_TIME.format(lap_time))
+    minutes, seconds, milliseconds = match.groups()
+    return lap_milliseconds(timedelta(minutes=int(minutes),
+                                      seconds=int(seconds),
+                                      milliseconds=int((milliseconds or "").ljust(3, "0"))))
 
 
 def xml_to_str(xml_tree: ET.Element) -> str:
@@ -36,8 +145,14 @@ def create_xml_tree(root: ET.Element, data: Union[list[dict], dict, str]) -> ET.
     # Each key value pair is on element in xml
     elif type(data) == dict:
         for k, v in data.items():
+            # List or object inside the object, e.g. rows of changed results
+            # or the driver ahead.
+            if type(v) in (list, dict):
+                root.append(create_xml_tree(ET.Element(k), v))
+                continue
             child = ET.Element(k)
-            child.text = str(v)
+            # Missing value is an empty element.
+            child.text = None if v is None else str(v)
             root.append(child)
     # Used for error response where xml contains only one element:
     # <error>error message</error>
@@ -66,9 +181,67 @@ def create_response(response_format: Optional[str],
     return jsonify(data)
 
 
-def error_response(e: Exception):
-    """Generates error response in xml or json format"""
+def generate_csv(columns: tuple[str, ...], rows: Iterator[tuple]) -> Iterator[str]:
+    """Generates csv from rows in chunks.
+
+    Args:
+        columns: names of columns in the header.
+        rows: rows to write.
+
+    Yields:
+        csv with header first and then chunks of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    # Write rows in chunks to avoid writing to the stream for every row.
+    for chunk in iter(lambda: list(islice(rows, CSV_CHUNK_SIZE)), []):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def create_bulk_response(response_format: str,
+                         columns: tuple[str, ...],
+                         rows: Iterator[tuple]) -> Response:
+    """Generates response in csv or columnar json format.
+
+    Keys are not repeated for every row, unlike in json or xml format.
+
+    Args:
+        response_format: response format, csv or columns.
+        columns: names of columns.
+        rows: rows with values in the order of columns.
+
+    Returns:
+        Streamed Response object in csv or Response object in columnar json:
+        {"columns": ["place", "id"], "rows": [[1, "SVF"]]}
+    """
+    if response_format == CSV_FORMAT:
+        # Request context is kept until the stream is finished.
+        return Response(stream_with_context(generate_csv(columns, rows)), mimetype=TEXT_CSV)
+    # Columnar json is not streamed, so rows are read in a database slot.
+    with admit():
+        rows = list(rows)
+    return jsonify({COLUMNS_KEY: columns, ROWS_KEY: rows})
+
+
+def error_response(e: Exception, status: int = 200) -> Response:
+    """Generates error response in xml or json format.
+
+    Args:
+        e: raised exception.
+        status: status code of the response.
+
+    Returns:
+        Response object in xml or json format.
+    """
     if request.args.get(FORMAT_PARAMETER) == XML_FORMAT:
         xml_tree = create_xml_tree(root=ET.Element(ERROR_TAG), data=str(e))
-        return Response(xml_to_str(xml_tree), mimetype=APPLICATION_XML)
-    return jsonify(error=str(e)), 200
+        return Response(xml_to_str(xml_tree), status=status, mimetype=APPLICATION_XML)
+    response = jsonify(error=str(e))
+    response.status_code = status
+    return response
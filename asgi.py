@@ -0,0 +1,11 @@
+from app.asgi import create_asgi_app
+from app.constants import DEVELOPMENT
+
+app = create_asgi_app(DEVELOPMENT)
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("Async serving mode requires an ASGI server: pip install uvicorn")
+    uvicorn.run(app)
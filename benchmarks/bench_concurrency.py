@@ -0,0 +1,166 @@
+"""Load test of sync and async serving modes.
+
+Many clients send requests at once to the application on a synthetic
+database. A part of the requests miss the caches and query the database.
+In sync mode requests are handled by a fixed number of worker threads, as
+in a threaded WSGI server. In async mode the ASGI application serves cached
+responses in the event loop and queries the database on its thread pool.
+Requests are sent in process, so the network is not measured.
+
+Usage:
+    python -m benchmarks.bench_concurrency --clients 1 64 512 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from app import create_app
+from app.asgi import AsyncApp, create_environ
+from app.constants import TESTING
+from app.extensions import db_wrapper, cache
+from app.db.models import get_models
+from benchmarks.bench_formats import fill_synthetic_data
+
+# Requests which are served from the cache after the first one.
+CACHED_URLS = ("/api/v1/report/", "/api/v1/report/?format=xml",
+               "/api/v1/report/drivers/", "/api/v1/report/drivers/D000042")
+
+
+def random_scope(miss_ratio: float) -> dict:
+    """Creates connection scope of a random request.
+
+    Args:
+        miss_ratio: share of requests with a new filter, which miss the caches.
+
+    Returns:
+        connection scope.
+    """
+    if random.random() < miss_ratio:
+        path = "/api/v1/report/"
+        query = f"fields=id,lap_time&lap_max=1:{random.randint(0, 29):02d}.{random.randint(0, 999):03d}"
+    else:
+        path, _, query = random.choice(CACHED_URLS).partition("?")
+    return {"type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": query.encode(),
+            "headers": [(b"accept-encoding", b"gzip")]}
+
+
+def call_wsgi(app: Flask, environ: dict) -> int:
+    """Handles request by the Flask application, as a WSGI server worker.
+
+    Returns:
+        status of the response.
+    """
+    started = []
+    chunks = app(environ, lambda status, headers, exc_info=None: started.append(status))
+    b"".join(chunks)
+    chunks.close()
+    return int(started[0].split(" ", 1)[0])
+
+
+async def call_asgi(app: AsyncApp, scope: dict) -> int:
+    """Handles request by the ASGI application, as an ASGI server.
+
+    Returns:
+        status of the response.
+    """
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def run_clients(clients: int, requests: int, miss_ratio: float, handle) -> tuple[float, list[float]]:
+    """Runs clients which send requests one after another.
+
+    Args:
+        clients: number of concurrent clients.
+        requests: number of requests of every client.
+        miss_ratio: share of requests which miss the caches.
+        handle: coroutine function which handles the scope and returns status.
+
+    Returns:
+        total time and latencies of requests in seconds.
+    """
+    latencies = []
+
+    async def client():
+        for _ in range(requests):
+            begin = time.perf_counter()
+            status = await handle(random_scope(miss_ratio))
+            latencies.append(time.perf_counter() - begin)
+            assert status == 200, status
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - begin, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000, help="number of drivers")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 64, 512],
+                        help="numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=20, help="number of requests per client")
+    parser.add_argument("--miss-ratio", type=float, default=0.05,
+                        help="share of requests which miss the caches")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="worker threads in sync mode and database threads in async mode")
+    args = parser.parse_args()
+
+    app = create_app(TESTING)
+    # Shed requests would fail the load test.
+    app.config["DB_MAX_QUEUE"] = max(args.clients)
+    with tempfile.TemporaryDirectory() as directory:
+        with app.app_context():
+            # Switch to a temporary database with synthetic data.
+            db_wrapper.database.init(os.path.join(directory, "bench.db"))
+            db_wrapper.database.create_tables(get_models().values())
+            fill_synthetic_data(args.rows)
+            # Requests open their own connection.
+            db_wrapper.database.close()
+            cache.clear()
+
+        workers = ThreadPoolExecutor(max_workers=args.threads)
+        asgi_app = AsyncApp(app, workers=args.threads, streams=app.config["STREAM_EXECUTOR_WORKERS"])
+
+        async def handle_sync(scope: dict) -> int:
+            environ = create_environ(scope, b"")
+            return await asyncio.get_running_loop().run_in_executor(workers, call_wsgi, app, environ)
+
+        async def handle_async(scope: dict) -> int:
+            return await call_asgi(asgi_app, scope)
+
+        print(f"{'mode':<6} {'clients':>8} {'requests/s':>11} {'p50, ms':>9} {'p99, ms':>9}")
+        for clients in args.clients:
+            for mode, handle in (("sync", handle_sync), ("async", handle_async)):
+                elapsed, latencies = asyncio.run(run_clients(clients, args.requests,
+                                                             args.miss_ratio, handle))
+                latencies.sort()
+                print(f"{mode:<6} {clients:>8} {len(latencies) / elapsed:>11.0f} "
+                      f"{statistics.median(latencies) * 1000:>9.1f} "
+                      f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>9.1f}")
+
+        workers.shutdown()
+        asgi_app.executor.shutdown()
+        asgi_app.stream_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
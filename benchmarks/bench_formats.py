@@ -0,0 +1,84 @@
+"""Benchmark of report response formats.
+
+Compares payload size and time of generating the report in json, xml,
+columnar json and csv formats on a synthetic database.
+
+Usage:
+    python -m benchmarks.bench_formats --rows 50000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.constants import TESTING
+from app.extensions import db_wrapper, cache
+from app.db.models import Team, Driver, Result, get_models
+from app.db.scripts.db_scripts import update_places
+from app.utils import format_lap_time, lap_milliseconds
+
+FORMATS = ("json", "xml", "columns", "csv")
+URLS = ("/api/v1/report/?format={}", "/api/v1/report/drivers/?format={}")
+
+
+def fill_synthetic_data(rows: int):
+    """Fills database with synthetic teams, drivers and results.
+
+    Args:
+        rows: number of drivers and results.
+    """
+    start = datetime(2018, 5, 24, 12)
+    with db_wrapper.database.atomic():
+        Team.insert_many([{"id": team_id, "name": f"TEAM {team_id}"}
+                          for team_id in range(1, 11)]).execute()
+        Driver.insert_many([{"id": f"D{number:06d}",
+                             "name": f"Name{number}",
+                             "surname": f"Surname{number}",
+                             "team_id": number % 10 + 1}
+                            for number in range(rows)]).execute()
+        laps = [timedelta(milliseconds=60000 + number * 7 % 30000) for number in range(rows)]
+        Result.insert_many([{"start_time": start,
+                             "end_time": start + lap,
+                             "lap_time": format_lap_time(lap),
+                             "lap_ms": lap_milliseconds(lap),
+                             "driver_id": f"D{number:06d}"}
+                            for number, lap in enumerate(laps)]).execute()
+        # Report is precomputed, as when database is filled from log files.
+        update_places()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000, help="number of drivers")
+    parser.add_argument("--repeat", type=int, default=5, help="number of requests per format")
+    args = parser.parse_args()
+
+    app = create_app(TESTING)
+    client = app.test_client()
+    with tempfile.TemporaryDirectory() as directory, app.app_context():
+        # Switch to a temporary database with synthetic data.
+        db_wrapper.database.init(os.path.join(directory, "bench.db"))
+        db_wrapper.database.create_tables(get_models().values())
+        fill_synthetic_data(args.rows)
+        # Requests open their own connection.
+        db_wrapper.database.close()
+
+        print(f"{'url':<40} {'size, KiB':>10} {'median, ms':>11}")
+        for url in URLS:
+            for response_format in FORMATS:
+                timings = []
+                for _ in range(args.repeat):
+                    # Measure generation, not the cached response.
+                    cache.clear()
+                    begin = time.perf_counter()
+                    size = len(client.get(url.format(response_format)).get_data())
+                    timings.append(time.perf_counter() - begin)
+                print(f"{url.format(response_format):<40} {size / 1024:>10.1f} "
+                      f"{statistics.median(timings) * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark of log file parsing.
+
+Compares throughput of sequential parsing and parallel parsing of byte
+ranges on a synthetic log file.
+
+Usage:
+    python -m benchmarks.bench_log_parsing --lines 2000000 --workers 4
+"""
+import argparse
+import os
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import product
+
+from app.constants import DATETIME_STRING
+from app.db.scripts.db_scripts import read_log
+
+
+def write_synthetic_log(path: str, lines: int):
+    """Writes log file with start times of synthetic drivers.
+
+    Args:
+        path: path to log file.
+        lines: number of lines.
+    """
+    # Three letter abbreviations of drivers: AAA, AAB, ...
+    drivers = ["".join(letters) for letters in product(string.ascii_uppercase, repeat=3)]
+    start = datetime(2018, 5, 24, 12)
+    with open(path, "w", encoding="utf8") as file:
+        for number in range(lines):
+            time_string = (start + timedelta(milliseconds=number)).strftime(DATETIME_STRING)[:-3]
+            file.write(f"{drivers[number % len(drivers)]}{time_string}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=2000000, help="number of lines in the log")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of workers")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "start.log")
+        write_synthetic_log(path, args.lines)
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"log: {args.lines} lines, {size:.1f} MiB, {os.cpu_count()} CPUs")
+
+        results = {}
+        for name, workers in (("sequential", 1), (f"parallel, {args.workers} workers", args.workers)):
+            begin = time.perf_counter()
+            results[name] = read_log(path, workers=workers, min_size=0)
+            elapsed = time.perf_counter() - begin
+            print(f"{name:<25} {elapsed:>8.2f} s {size / elapsed:>8.1f} MiB/s "
+                  f"{args.lines / elapsed:>12.0f} lines/s")
+
+        sequential, parallel = results.values()
+        assert sequential == parallel, "parallel result differs from sequential"
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,14 @@ import logging
 from app.constants import LOGGING_FILE, LOGGING_FORMAT, DEVELOPMENT, TESTING, DEFAULT
 
 # Cache configuration dictionary
+# Cached queries are served stale for CACHE_STALE_TIMEOUT seconds after
+# CACHE_DEFAULT_TIMEOUT while they are refreshed.
+# CACHE_THRESHOLD is the maximum number of cached items, above it a third of
+# the items is evicted, so it fits query and response variants of many filters.
 CACHE_CONFIG = {"CACHE_TYPE": "SimpleCache",
-                "CACHE_DEFAULT_TIMEOUT": 300}
+                "CACHE_DEFAULT_TIMEOUT": 300,
+                "CACHE_STALE_TIMEOUT": 600,
+                "CACHE_THRESHOLD": 10000}
 
 
 class Config:
@@ -15,6 +21,27 @@ class Config:
     FLASK_ENV = "development"
     DEBUG = False
     TESTING = False
+    # Requests can be profiled with profile=1 parameter or X-Profile: 1 header.
+    PROFILING = False
+    # Directory where request profiles are stored.
+    PROFILE_DIR = "profiles"
+    # Maximum number of concurrently running database queries.
+    DB_MAX_CONCURRENCY = 4
+    # Maximum number of queries waiting for a free slot, others are shed with 503.
+    DB_MAX_QUEUE = 16
+    # Seconds a query waits for a free slot before it is shed.
+    DB_QUEUE_TIMEOUT = 5
+    # Seconds in Retry-After header of shed requests.
+    DB_RETRY_AFTER = 1
+    # Number of threads which query the database in async serving mode.
+    DB_EXECUTOR_WORKERS = 8
+    # Maximum number of concurrently streamed responses in async serving mode,
+    # every stream holds a thread, others are refused with 503.
+    STREAM_EXECUTOR_WORKERS = 64
+    # Season of results in DATABASE, laps are only added to it.
+    SEASON = "2018"
+    # Directory of archived seasons, one <season>.db file per season.
+    SHARD_DIR = "shards"
 
     @staticmethod
     def init_app(config_name: str):
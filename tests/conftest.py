@@ -3,6 +3,7 @@ from flask.testing import FlaskClient
 
 from app import create_app
 from app.constants import TESTING
+from app.db.scripts.db_scripts import reload_database, wait_for_warm_up
 
 
 @pytest.fixture(scope="session")
@@ -15,3 +16,16 @@ def client() -> FlaskClient:
     app = create_app(TESTING)
     return app.test_client()
 
+
+@pytest.fixture()
+def restore_data(client: FlaskClient):
+    """Reload data from log files after the test which changes data.
+
+    Args:
+        client: Flask test client.
+    """
+    yield
+    # Cache is not warmed up for previous data while it is reloaded.
+    wait_for_warm_up()
+    with client.application.app_context():
+        reload_database()
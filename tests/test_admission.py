@@ -0,0 +1,129 @@
+"""Tests for admission control of database queries"""
+import threading
+
+import pytest
+from flask.testing import FlaskClient
+
+from app.db.admission import Admission, Overloaded
+
+
+class TestAdmission:
+    """
+    Tests for concurrency limit and bounded wait queue.
+    """
+
+    def test_queue_full(self):
+        """Test query is shed when all slots are taken and queue is full."""
+        admission = Admission()
+        with admission.admit(max_concurrency=1, max_queue=0, timeout=1, retry_after=2):
+            with pytest.raises(Overloaded) as error:
+                with admission.admit(max_concurrency=1, max_queue=0, timeout=1, retry_after=2):
+                    pass
+        assert error.value.code == 503
+        assert error.value.retry_after == 2
+        assert admission.metrics() == {"active": 0, "waiting": 0, "admitted": 1, "shed": 1}
+
+    def test_queue_timeout(self):
+        """Test queued query is shed when slot is not freed in time."""
+        admission = Admission()
+        with admission.admit(max_concurrency=1, max_queue=1, timeout=1, retry_after=1):
+            with pytest.raises(Overloaded):
+                with admission.admit(max_concurrency=1, max_queue=1, timeout=0.05, retry_after=1):
+                    pass
+        assert admission.metrics()["shed"] == 1
+
+    def test_queued_query_is_admitted(self):
+        """Test queued query runs when slot is freed."""
+        admission = Admission()
+        queued = threading.Event()
+        results = []
+
+        def query():
+            queued.set()
+            with admission.admit(max_concurrency=1, max_queue=1, timeout=5, retry_after=1):
+                results.append(admission.metrics()["active"])
+
+        with admission.admit(max_concurrency=1, max_queue=1, timeout=5, retry_after=1):
+            thread = threading.Thread(target=query)
+            thread.start()
+            queued.wait()
+            while admission.metrics()["waiting"] == 0:
+                pass
+        thread.join()
+
+        assert results == [1]
+        assert admission.metrics() == {"active": 0, "waiting": 0, "admitted": 2, "shed": 0}
+
+
+class TestLoadShedding:
+    """
+    Tests for shed requests and metrics.
+    """
+
+    @pytest.fixture()
+    def no_slots(self, client: FlaskClient):
+        """Take away all slots and queue, so every query is shed.
+
+        Args:
+            client: Flask test client.
+        """
+        config = client.application.config
+        limits = config["DB_MAX_CONCURRENCY"], config["DB_MAX_QUEUE"]
+        config["DB_MAX_CONCURRENCY"], config["DB_MAX_QUEUE"] = 0, 0
+        yield
+        config["DB_MAX_CONCURRENCY"], config["DB_MAX_QUEUE"] = limits
+
+    @pytest.mark.parametrize("url", ["/api/v1/report/?team=shed",
+                                     "/api/v1/report/?team=shed&format=columns",
+                                     "/api/v1/report/drivers/?team=shed",
+                                     "/api/v1/report/drivers/?team=shed&format=columns",
+                                     "/api/v1/report/drivers/SHD"])
+    def test_shed_request(self, client: FlaskClient, no_slots, url: str):
+        """Test shed request fails with 503 and Retry-After.
+
+        Args:
+            client: Flask test client.
+            url: url of DB-bound request.
+        """
+        shed = client.get("/api/v1/metrics").json["db_shed"]
+        response = client.get(url)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert "overloaded" in response.json["error"]
+        assert client.get("/api/v1/metrics").json["db_shed"] == shed + 1
+
+    def test_shed_request_xml(self, client: FlaskClient, no_slots):
+        """Test shed request error in xml format.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/report/?team=shed&format=xml")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert response.mimetype == "application/xml"
+
+    def test_cached_response_is_not_shed(self, client: FlaskClient, no_slots):
+        """Test cached response does not take a database slot.
+
+        Report is cached when the database is filled.
+
+        Args:
+            client: Flask test client.
+        """
+        assert client.get("/api/v1/report/").status_code == 200
+
+    def test_metrics(self, client: FlaskClient):
+        """Test metrics contain limits, queue depth and counters.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/metrics")
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "no-store"
+        assert response.json["db_max_concurrency"] == 4
+        assert response.json["db_max_queue"] == 16
+        assert response.json["db_active"] == 0
+        assert response.json["db_queue_depth"] == 0
+        assert {"db_admitted", "db_shed"} <= response.json.keys()
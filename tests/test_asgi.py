@@ -0,0 +1,194 @@
+"""Tests for async serving mode"""
+import asyncio
+import gzip
+
+import pytest
+from flask.testing import FlaskClient
+
+from app.asgi import AsyncApp
+from app import stream
+from app.stream import broadcaster
+
+
+def call(app: AsyncApp, path: str, query: str = "",
+         headers: tuple[tuple[str, str], ...] = ()) -> tuple[int, dict, bytes]:
+    """Sends GET request to ASGI application.
+
+    Args:
+        app: ASGI application.
+        path: request path.
+        query: query string.
+        headers: request headers.
+
+    Returns:
+        status, headers and body of the response.
+    """
+    messages = []
+    scope = {"type": "http",
+             "method": "GET",
+             "http_version": "1.1",
+             "scheme": "http",
+             "path": path,
+             "query_string": query.encode(),
+             "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+             "server": ("localhost", 8000),
+             "client": ("127.0.0.1", 50000)}
+
+    async def receive():
+        if not messages:
+            return {"type": "http.request", "body": b""}
+        # Connection is kept open until the response is sent.
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    return (start["status"],
+            {name.decode(): value.decode() for name, value in start["headers"]},
+            b"".join(message.get("body", b"") for message in messages[1:]))
+
+
+@pytest.fixture()
+def async_app(client: FlaskClient) -> AsyncApp:
+    """Create ASGI application for the test application.
+
+    Args:
+        client: Flask test client.
+
+    Returns:
+        ASGI application.
+    """
+    app = AsyncApp(client.application, workers=2, streams=2)
+    yield app
+    app.executor.shutdown()
+    app.stream_executor.shutdown()
+
+
+class TestAsyncApp:
+    """
+    Tests for routes served by ASGI application.
+    """
+
+    @pytest.mark.parametrize("path, query", [("/api/v1/report/", "order=desc"),
+                                             ("/api/v1/report/", "format=xml&fields=id,place"),
+                                             ("/api/v1/report/drivers/", "team=ferrari"),
+                                             ("/api/v1/report/drivers/SVF", "format=xml"),
+                                             ("/api/v1/report/drivers/XXX", ""),
+                                             ("/api/v1/report/", "fields=unknown")])
+    def test_same_output(self, client: FlaskClient, async_app: AsyncApp, path: str, query: str):
+        """Test response is the same as in Flask application.
+
+        Args:
+            client: Flask test client.
+            async_app: ASGI application.
+            path: request path.
+            query: query string.
+        """
+        status, headers, body = call(async_app, path, query)
+        response = client.get(f"{path}?{query}")
+        assert status == response.status_code
+        assert headers["content-type"] == response.headers["Content-Type"]
+        assert body == response.data
+
+    def test_cached_response_in_event_loop(self, client: FlaskClient, async_app: AsyncApp):
+        """Test cached response is served without the pool threads.
+
+        Args:
+            client: Flask test client.
+            async_app: ASGI application.
+        """
+        client.get("/api/v1/report/", headers={"Accept-Encoding": "gzip"})
+        # Pool can not run requests anymore.
+        async_app.executor.shutdown()
+
+        status, headers, body = call(async_app, "/api/v1/report/",
+                                     headers=(("Accept-Encoding", "gzip"),))
+        assert status == 200
+        assert headers["content-encoding"] == "gzip"
+        assert b"Vettel" in gzip.decompress(body)
+
+    def test_streamed_response(self, async_app: AsyncApp):
+        """Test csv body is streamed.
+
+        Args:
+            async_app: ASGI application.
+        """
+        status, headers, body = call(async_app, "/api/v1/report/", "format=csv&fields=id,place")
+        assert status == 200
+        assert "content-length" not in headers
+        assert body.decode().splitlines()[:2] == ["id,place", "SVF,1"]
+
+    def test_concurrent_requests(self, async_app: AsyncApp):
+        """Test concurrent requests which miss the cache are handled by the pool.
+
+        Args:
+            async_app: ASGI application.
+        """
+        prefixes = ["A", "B", "G", "H", "L", "O", "R", "S", "V"]
+
+        async def requests():
+            loop = asyncio.get_running_loop()
+            return await asyncio.gather(*(loop.run_in_executor(None, call, async_app,
+                                                               "/api/v1/report/drivers/",
+                                                               f"name_prefix={prefix}&fields=id")
+                                          for prefix in prefixes))
+
+        responses = asyncio.run(requests())
+        assert [status for status, _, _ in responses] == [200] * len(prefixes)
+
+    def test_streams_above_limit(self, async_app: AsyncApp, monkeypatch):
+        """Test streams above the limit are refused, others are sent.
+
+        Args:
+            async_app: ASGI application.
+            monkeypatch: pytest fixture for patching.
+        """
+        # Stream threads stop on the next keep-alive after disconnect.
+        monkeypatch.setattr(stream, "STREAM_KEEPALIVE", 0.05)
+
+        async def open_streams(count: int) -> list[list[dict]]:
+            closed = asyncio.Event()
+            streams = [[] for _ in range(count)]
+
+            async def open_stream(messages: list[dict]):
+                async def receive():
+                    if not messages:
+                        return {"type": "http.request", "body": b""}
+                    await closed.wait()
+                    return {"type": "http.disconnect"}
+
+                async def send(message):
+                    messages.append(message)
+                    # Other streams are handled while the response is started.
+                    await asyncio.sleep(0.01)
+
+                await async_app({"type": "http",
+                                 "method": "GET",
+                                 "path": "/api/v1/report/stream",
+                                 "query_string": b"",
+                                 "headers": []}, receive, send)
+
+            async def wait_for_bodies():
+                while sum(len(messages) >= 2 for messages in streams) < count:
+                    await asyncio.sleep(0.01)
+
+            tasks = [asyncio.create_task(open_stream(messages)) for messages in streams]
+            # Streams are open until the standings are sent or the stream is refused.
+            await asyncio.wait_for(wait_for_bodies(), timeout=10)
+            closed.set()
+            await asyncio.gather(*tasks)
+            return streams
+
+        streams = asyncio.run(open_streams(async_app.max_streams + 1))
+        statuses = sorted(messages[0]["status"] for messages in streams)
+        assert statuses == [200] * async_app.max_streams + [503]
+        for messages in streams:
+            if messages[0]["status"] == 200:
+                assert messages[1]["body"].startswith(b"event: standings")
+            else:
+                assert (b"retry-after", b"1") in messages[0]["headers"]
+                assert b"overloaded" in messages[1]["body"]
+        assert async_app.streams == 0
+        assert not broadcaster.has_subscribers()
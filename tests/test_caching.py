@@ -0,0 +1,126 @@
+"""Tests for caching of queries and responses"""
+import threading
+import time
+
+from flask.testing import FlaskClient
+
+from app.extensions import cache
+from app.db.caching import cached_query, single_flight
+from app.db.version import get_data_version
+from app.constants import RESPONSE_CACHE_KEY
+from config import CACHE_CONFIG
+
+
+class Model:
+    """Model with cached query which counts calls"""
+    calls = 0
+
+    @classmethod
+    @cached_query
+    def get_value(cls, value: str, suffix: str = "") -> str:
+        cls.calls += 1
+        time.sleep(0.05)
+        return value + suffix
+
+
+class TestCachedQuery:
+    """
+    Tests for query caching.
+    """
+
+    def test_single_flight(self, client: FlaskClient):
+        """Test concurrent calls with the same key run query once.
+
+        Args:
+            client: Flask test client.
+        """
+        calls = []
+        results = []
+
+        def query():
+            calls.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        def call():
+            with client.application.app_context():
+                results.append(single_flight("single-flight-test", query))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == ["value"] * 5
+
+    def test_cached_by_arguments(self, client: FlaskClient):
+        """Test positional and keyword arguments share the cache.
+
+        Args:
+            client: Flask test client.
+        """
+        with client.application.app_context():
+            Model.calls = 0
+            assert Model.get_value("a") == "a"
+            assert Model.get_value(value="a", suffix="") == "a"
+            assert Model.get_value("a", "b") == "ab"
+            assert Model.calls == 2
+
+    def test_stale_value(self, client: FlaskClient, monkeypatch):
+        """Test stale value is served while it is refreshed in background.
+
+        Args:
+            client: Flask test client.
+            monkeypatch: pytest fixture for patching.
+        """
+        monkeypatch.setitem(CACHE_CONFIG, "CACHE_DEFAULT_TIMEOUT", 0)
+        with client.application.app_context():
+            Model.calls = 0
+            assert Model.get_value("stale") == "stale"
+            # Value is stale, but served without waiting for the query.
+            assert Model.get_value("stale") == "stale"
+            for _ in range(100):
+                if Model.calls == 2:
+                    break
+                time.sleep(0.01)
+            assert Model.calls == 2
+
+    def test_stale_value_refreshed_once(self, client: FlaskClient, monkeypatch):
+        """Test requests which get stale value during refresh start no threads.
+
+        Args:
+            client: Flask test client.
+            monkeypatch: pytest fixture for patching.
+        """
+        monkeypatch.setitem(CACHE_CONFIG, "CACHE_DEFAULT_TIMEOUT", 0)
+        started = []
+        monkeypatch.setattr(threading.Thread, "start",
+                            lambda thread, start=threading.Thread.start: (started.append(thread),
+                                                                          start(thread)))
+        with client.application.app_context():
+            Model.calls = 0
+            assert Model.get_value("refreshed") == "refreshed"
+            for _ in range(10):
+                assert Model.get_value("refreshed") == "refreshed"
+            for thread in started:
+                thread.join()
+            assert len(started) == 1
+            assert Model.calls == 2
+
+
+class TestWarmUp:
+    """
+    Tests for cache warm up.
+    """
+
+    def test_response_is_cached(self, client: FlaskClient):
+        """Test common responses are cached after the start.
+
+        Args:
+            client: Flask test client.
+        """
+        with client.application.app_context():
+            for path in ("/api/v1/report/?", "/api/v1/report/drivers/?order=desc&format=xml"):
+                assert cache.get(RESPONSE_CACHE_KEY.format(get_data_version(), "gzip", path))
@@ -0,0 +1,189 @@
+"""Tests for database scripts"""
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from flask.testing import FlaskClient
+
+from app.extensions import db_wrapper
+from app.db.scripts.db_scripts import reload_database, read_log, split_log, add_lap, \
+    wait_for_warm_up
+from app.db.version import get_data_version
+from app.extensions import cache
+from app.constants import START_LOG, END_LOG, RESPONSE_CACHE_KEY
+
+
+class TestReloadDatabase:
+    """
+    Tests for data reload with database snapshot swap.
+    """
+
+    def test_snapshot_is_swapped(self, client: FlaskClient):
+        """Test database file is replaced with complete snapshot.
+
+        Args:
+            client: Flask test client.
+        """
+        path = db_wrapper.database.database
+        with client.application.app_context():
+            inode = os.stat(path).st_ino
+            version = get_data_version()
+            reload_database()
+            assert os.stat(path).st_ino != inode
+            assert get_data_version() != version
+
+        report = client.get("/api/v1/report/?fields=place,id").get_json()
+        assert [driver["place"] for driver in report] == list(range(1, 20))
+        assert not [name for name in os.listdir(os.path.dirname(os.path.abspath(path)))
+                    if name.endswith(".snapshot")]
+
+    def test_open_connection_reads_previous_snapshot(self, client: FlaskClient):
+        """Test connection opened before reload keeps reading complete data.
+
+        Args:
+            client: Flask test client.
+        """
+        connection = sqlite3.connect(db_wrapper.database.database)
+        try:
+            with client.application.app_context():
+                reload_database()
+            assert connection.execute("SELECT COUNT(*) FROM result").fetchone() == (19,)
+        finally:
+            connection.close()
+
+    def test_swap_by_another_process(self, client: FlaskClient, tmp_path):
+        """Test cached responses are invalidated if database file is replaced.
+
+        Args:
+            client: Flask test client.
+            tmp_path: temporary directory.
+        """
+        path = db_wrapper.database.database
+        with client.application.app_context():
+            version = get_data_version()
+        shutil.copy(path, tmp_path / "copy.db")
+        os.replace(tmp_path / "copy.db", path)
+
+        client.get("/api/v1/report/")
+        wait_for_warm_up()
+        with client.application.app_context():
+            assert get_data_version() != version
+            # Common responses are cached for the new data.
+            key = RESPONSE_CACHE_KEY.format(get_data_version(), "gzip",
+                                            "/api/v1/report/drivers/?order=desc&format=xml")
+            assert cache.get(key)
+
+
+    def test_app_started_from_main_module(self, tmp_path):
+        """Test app creates a new database when it is started as a script.
+
+        Processes spawned to parse logs import the main module again,
+        which creates the app.
+
+        Args:
+            tmp_path: temporary directory.
+        """
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        os.symlink(os.path.join(root, os.path.dirname(START_LOG)), tmp_path / os.path.dirname(START_LOG))
+        script = tmp_path / "main.py"
+        script.write_text(f"""import sys
+sys.path.insert(0, {root!r})
+from app import create_app
+from app.constants import DEVELOPMENT
+from app.db.scripts.db_scripts import read_log
+
+app = create_app(DEVELOPMENT)
+
+if __name__ == "__main__":
+    times = read_log({START_LOG!r}, workers=2, min_size=0, chunk_size=64)
+    print(len(app.test_client().get("/api/v1/report/").get_json()), len(times))
+""")
+        result = subprocess.run([sys.executable, str(script)], cwd=tmp_path,
+                                capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.split() == ["19", "19"]
+
+
+class TestReadLog:
+    """
+    Tests for parallel parsing of log files.
+    """
+
+    @pytest.mark.parametrize("path", [START_LOG, END_LOG])
+    def test_parallel_equals_sequential(self, path):
+        """Test parallel parsing of byte ranges gives the same result.
+
+        Args:
+            path: path to log file.
+        """
+        sequential = read_log(path, workers=1)
+        parallel = read_log(path, workers=2, min_size=0, chunk_size=100)
+        assert parallel == sequential
+        assert list(parallel) == list(sequential)
+
+    def test_last_time_wins(self, tmp_path):
+        """Test the last time of driver wins across byte ranges.
+
+        Args:
+            tmp_path: temporary directory.
+        """
+        log = tmp_path / "start.log"
+        log.write_text("SVF2018-05-24_12:02:58.917\n\nNHR2018-05-24_12:02:49.914\n"
+                       "SVF2018-05-24_12:03:58.917")
+        parallel = read_log(str(log), workers=2, min_size=0, chunk_size=10)
+        assert len(split_log(str(log), 10)) == 3
+        assert parallel == read_log(str(log), workers=1)
+        assert parallel["SVF"].minute == 3
+
+
+class TestVersions:
+    """
+    Tests for versions of results.
+    """
+
+    def test_changed_results(self, client: FlaskClient, restore_data):
+        """Test only results which place or lap time changed get new version.
+
+        Args:
+            client: Flask test client.
+            restore_data: fixture which restores data.
+        """
+        version = client.get("/api/v1/report/?since=0").get_json()["version"]
+        start = datetime(2018, 5, 24, 12, 30)
+        with client.application.app_context():
+            # DRR moves from 16th to 15th place, KMH from 15th to 16th.
+            add_lap("DRR", start, start + timedelta(minutes=1, seconds=13, milliseconds=390))
+
+        changes = client.get(f"/api/v1/report/?since={version}&fields=place,id").get_json()
+        assert changes == {"version": version + 1,
+                           "rows": [{"place": 15, "id": "DRR"}, {"place": 16, "id": "KMH"}]}
+
+    def test_cache_warmed_up_after_lap(self, client: FlaskClient, restore_data):
+        """Test common responses are cached for data with the new lap.
+
+        Args:
+            client: Flask test client.
+            restore_data: fixture which restores data.
+        """
+        start = datetime(2018, 5, 24, 12, 30)
+        with client.application.app_context():
+            assert add_lap("LHM", start, start + timedelta(seconds=60))
+            wait_for_warm_up()
+            key = RESPONSE_CACHE_KEY.format(get_data_version(), "identity", "/api/v1/report/?")
+            assert b"\"lap_time\":\"1:00.000\"" in cache.get(key)[0]
+
+    def test_versions_kept_on_reload(self, client: FlaskClient):
+        """Test reload with the same data doesn't change versions.
+
+        Args:
+            client: Flask test client.
+        """
+        version = client.get("/api/v1/report/?since=0").get_json()["version"]
+        with client.application.app_context():
+            reload_database()
+        changes = client.get(f"/api/v1/report/?since={version}").get_json()
+        assert changes == {"version": version, "rows": []}
@@ -0,0 +1,159 @@
+"""Tests for leaderboard index and rank of a driver"""
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+import pytest
+from flask.testing import FlaskClient
+
+from app.extensions import db_wrapper
+from app.db.leaderboard import Leaderboard, Entry, leaderboard
+from app.db.models import Result
+from app.db.scripts.db_scripts import add_lap
+from app.db.version import get_data_version
+
+
+def entry(driver_id: str, result_id: int, seconds: float) -> Entry:
+    """Creates leaderboard entry with lap of given seconds."""
+    lap = timedelta(seconds=seconds)
+    return Entry(lap, result_id, driver_id, f"1:{seconds - 60:06.3f}")
+
+
+class TestLeaderboard:
+    """
+    Tests for sorted index of results.
+    """
+
+    def test_rank(self):
+        """Test place, gap and neighbours are found for the driver."""
+        index = Leaderboard()
+        index.load([entry("CCC", 3, 63), entry("AAA", 1, 61), entry("BBB", 2, 62)], version=1)
+
+        rank = index.rank("BBB")
+        assert rank.place == 2
+        assert rank.gap == timedelta(seconds=1)
+        assert rank.ahead.driver_id == "AAA"
+        assert rank.behind.driver_id == "CCC"
+        assert index.rank("AAA").ahead is None
+        assert index.rank("CCC").behind is None
+        assert index.rank("DDD") is None
+
+    def test_equal_laps(self):
+        """Test equal laps are ordered by result id as places."""
+        index = Leaderboard()
+        index.load([entry("BBB", 2, 61), entry("AAA", 1, 61)], version=1)
+        assert index.rank("AAA").place == 1
+        assert index.rank("BBB").place == 2
+
+    def test_update(self):
+        """Test result of the driver is moved in place."""
+        index = Leaderboard()
+        index.load([entry("AAA", 1, 61), entry("BBB", 2, 62), entry("CCC", 3, 63)], version=1)
+        index.update(entry("CCC", 3, 60), previous_version=1, version=2)
+
+        assert index.is_loaded(2)
+        assert [e.driver_id for e in index.entries] == ["CCC", "AAA", "BBB"]
+        assert index.rank("AAA").place == 2
+
+    def test_update_of_outdated_index(self):
+        """Test index which is not loaded for the previous version is not updated."""
+        index = Leaderboard()
+        index.load([entry("AAA", 1, 61)], version=1)
+        index.update(entry("BBB", 2, 60), previous_version=2, version=3)
+
+        assert not index.is_loaded(3)
+        assert index.rank("BBB") is None
+
+
+class TestDriverRank:
+    """
+    Tests for rank in [GET] "/api/v1/report/drivers/{driver_id}"
+    """
+
+    def test_leader(self, client: FlaskClient):
+        """Test rank of the leader.
+
+        Args:
+            client: Flask test client.
+        """
+        driver = client.get("/api/v1/report/drivers/SVF").get_json()
+        assert driver["place"] == 1
+        assert driver["gap"] == "0:00.000"
+        assert driver["ahead"] is None
+        assert driver["behind"] == {"place": 2,
+                                    "id": "VBM",
+                                    "name": "Valtteri",
+                                    "surname": "Bottas",
+                                    "lap_time": "1:12.434",
+                                    "gap": "0:08.019"}
+
+    def test_last(self, client: FlaskClient):
+        """Test rank of the last driver.
+
+        Args:
+            client: Flask test client.
+        """
+        driver = client.get("/api/v1/report/drivers/LHM?fields=place,ahead,behind").get_json()
+        assert driver == {"place": 19,
+                          "ahead": {"place": 18,
+                                    "id": "EOF",
+                                    "name": "Esteban",
+                                    "surname": "Ocon",
+                                    "lap_time": "5:46.972",
+                                    "gap": "4:42.557"},
+                          "behind": None}
+
+    @pytest.mark.parametrize("driver_id, fields, expected",
+                             [("SVF", "place,gap", {"place": 1, "gap": "0:00.000"}),
+                              ("BHS", "place", {"place": 12})])
+    def test_rank_without_neighbours(self, client: FlaskClient, driver_id: str, fields: str,
+                                     expected: dict):
+        """Test rank fields without the drivers ahead and behind.
+
+        Args:
+            client: Flask test client.
+            driver_id: driver's id.
+            fields: requested fields.
+            expected: expected response.
+        """
+        driver = client.get(f"/api/v1/report/drivers/{driver_id}?fields={fields}").get_json()
+        assert driver == expected
+
+    def test_rank_in_xml(self, client: FlaskClient):
+        """Test driver ahead is nested element in xml.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/report/drivers/VBM?fields=id,place,ahead,behind&format=xml")
+        driver = ET.fromstring(response.data)
+        assert driver.find("place").text == "2"
+        assert driver.find("ahead/id").text == "SVF"
+        assert driver.find("behind/id").text == "SVM"
+
+    def test_rank_after_lap(self, client: FlaskClient, restore_data):
+        """Test index is updated in place and matches places in database.
+
+        Args:
+            client: Flask test client.
+            restore_data: fixture which restores data.
+        """
+        with client.application.app_context():
+            with db_wrapper.database.connection_context():
+                Result.get_leaderboard()
+            start = datetime(2018, 5, 24, 12, 0)
+            assert add_lap("LHM", start, start + timedelta(minutes=1, seconds=5))
+            # Index was updated, not loaded again.
+            assert leaderboard.is_loaded(get_data_version())
+            with db_wrapper.database.connection_context():
+                places = dict(Result.select(Result.driver_id, Result.place).tuples())
+            assert {driver_id: leaderboard.rank(driver_id).place for driver_id in places} == places
+
+        driver = client.get("/api/v1/report/drivers/LHM?fields=place,gap,ahead").get_json()
+        assert driver == {"place": 2,
+                          "gap": "0:00.585",
+                          "ahead": {"place": 1,
+                                    "id": "SVF",
+                                    "name": "Sebastian",
+                                    "surname": "Vettel",
+                                    "lap_time": "1:04.415",
+                                    "gap": "0:00.000"}}
@@ -0,0 +1,65 @@
+"""Tests for profiling of requests"""
+import os
+
+import pytest
+from flask.testing import FlaskClient
+
+from app.profiling import profiles_command
+
+
+@pytest.fixture()
+def profiling(client: FlaskClient, tmp_path, monkeypatch) -> str:
+    """Enable profiling and store profiles to temporary directory.
+
+    Returns:
+        directory with profiles.
+    """
+    monkeypatch.setitem(client.application.config, "PROFILING", True)
+    monkeypatch.setitem(client.application.config, "PROFILE_DIR", str(tmp_path))
+    return str(tmp_path)
+
+
+class TestProfiling:
+    """
+    Tests for profiling of requests.
+    """
+
+    @pytest.mark.parametrize("url, headers", [("/api/v1/report/?profile=1", {}),
+                                              ("/api/v1/report/drivers/BHS", {"X-Profile": "1"})])
+    def test_profile_is_stored(self, client: FlaskClient, profiling, url, headers):
+        """Test profile and summary are stored and returned in headers.
+
+        Args:
+            client: Flask test client.
+            profiling: directory with profiles.
+            url: request path with parameters.
+            headers: request headers.
+        """
+        response = client.get(url, headers=headers)
+        name = response.headers["X-Profile-File"]
+        assert response.status_code == 200
+        assert int(response.headers["X-Profile-Peak-Memory"]) > 0
+        assert os.path.exists(os.path.join(profiling, name))
+        assert os.path.exists(os.path.join(profiling, name.replace(".prof", ".json")))
+
+    def test_profiling_disabled(self, client: FlaskClient):
+        """Test request is not profiled if profiling is disabled.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/report/?profile=1")
+        assert "X-Profile-File" not in response.headers
+
+    def test_profiles_command(self, client: FlaskClient, profiling):
+        """Test stored profiles are aggregated.
+
+        Args:
+            client: Flask test client.
+            profiling: directory with profiles.
+        """
+        client.get("/api/v1/report/?profile=1&format=xml")
+        client.get("/api/v1/report/?profile=1&order=desc")
+        result = client.application.test_cli_runner().invoke(profiles_command)
+        assert "api.report" in result.output
+        assert "get_report" in result.output
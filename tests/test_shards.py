@@ -0,0 +1,232 @@
+"""Tests for per-season shards and query router"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from flask.testing import FlaskClient
+
+from app.extensions import db_wrapper
+from app.db.scripts.db_scripts import archive_season, add_lap
+from app.db.shards import MAX_ATTACHED
+from app.db.version import bump_data_version
+
+
+@pytest.fixture()
+def archived_season(client: FlaskClient, tmp_path):
+    """Archive current results as 2017 season with other lap times.
+
+    In 2017 season Sebastian Vettel's lap is 1:05.000 and Lewis Hamilton
+    has no result.
+
+    Args:
+        client: Flask test client.
+        tmp_path: temporary directory for shards.
+    """
+    app = client.application
+    shard_dir = app.config["SHARD_DIR"]
+    app.config["SHARD_DIR"] = str(tmp_path)
+    with app.app_context():
+        path = archive_season("2017")
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("UPDATE result SET lap_time = '1:05.000' WHERE driver_id = 'SVF'")
+        connection.execute("DELETE FROM result WHERE driver_id = 'LHM'")
+    connection.close()
+    db_wrapper.database.init_app(app)
+    with app.app_context():
+        bump_data_version()
+    yield path
+
+    app.config["SHARD_DIR"] = shard_dir
+    db_wrapper.database.init_app(app)
+    with app.app_context():
+        bump_data_version()
+
+
+@pytest.fixture()
+def many_archived_seasons(client: FlaskClient, tmp_path):
+    """Archive current results as more seasons than SQLite can attach at once.
+
+    Args:
+        client: Flask test client.
+        tmp_path: temporary directory for shards.
+    """
+    app = client.application
+    shard_dir = app.config["SHARD_DIR"]
+    app.config["SHARD_DIR"] = str(tmp_path)
+    seasons = [str(season) for season in range(2018 - MAX_ATTACHED - 2, 2018)]
+    with app.app_context():
+        for season in seasons:
+            archive_season(season)
+    db_wrapper.database.init_app(app)
+    with app.app_context():
+        bump_data_version()
+    yield seasons
+
+    app.config["SHARD_DIR"] = shard_dir
+    db_wrapper.database.init_app(app)
+    with app.app_context():
+        bump_data_version()
+
+
+class TestQueryRouter:
+    """
+    Tests for per-race queries on a single shard.
+    """
+
+    def test_seasons(self, archived_season):
+        """Test archived shards are discovered, current season is not archived.
+
+        Args:
+            archived_season: fixture which archives a season.
+        """
+        assert db_wrapper.database.seasons() == ["2017"]
+
+    def test_report_of_season(self, client: FlaskClient, archived_season):
+        """Test report is read from the shard of the season.
+
+        Args:
+            client: Flask test client.
+            archived_season: fixture which archives a season.
+        """
+        archived = client.get("/api/v1/report/?season=2017&fields=id,lap_time").get_json()
+        current = client.get("/api/v1/report/?fields=id,lap_time").get_json()
+        assert {"id": "SVF", "lap_time": "1:05.000"} in archived
+        assert "LHM" not in [row["id"] for row in archived]
+        assert {"id": "SVF", "lap_time": "1:04.415"} in current
+        assert client.get("/api/v1/report/?season=2018&fields=id,lap_time").get_json() == current
+
+    def test_csv_of_season(self, client: FlaskClient, archived_season):
+        """Test streamed report is read from the shard of the season.
+
+        Args:
+            client: Flask test client.
+            archived_season: fixture which archives a season.
+        """
+        response = client.get("/api/v1/report/?season=2017&format=csv&fields=id,lap_time")
+        assert "SVF,1:05.000" in response.get_data(as_text=True).splitlines()
+
+    def test_single_driver_of_season(self, client: FlaskClient, archived_season):
+        """Test rank is read from the leaderboard of the season.
+
+        Args:
+            client: Flask test client.
+            archived_season: fixture which archives a season.
+        """
+        driver = client.get("/api/v1/report/drivers/EOF?season=2017&fields=id,place,behind").get_json()
+        assert driver == {"id": "EOF", "place": 18, "behind": None}
+
+    def test_unknown_season(self, client: FlaskClient, archived_season):
+        """Test error message when season is not archived.
+
+        Args:
+            client: Flask test client.
+            archived_season: fixture which archives a season.
+        """
+        response = client.get("/api/v1/report/drivers/?season=2016")
+        assert response.get_json()["error"] == "404 Not Found: A season '2016' was not found. " \
+                                               "Archived seasons: 2017."
+
+    def test_ingest_writes_current_shard(self, client: FlaskClient, archived_season, restore_data):
+        """Test lap is added only to the current season.
+
+        Args:
+            client: Flask test client.
+            archived_season: fixture which archives a season.
+            restore_data: fixture which restores data.
+        """
+        with client.application.app_context():
+            start = datetime(2018, 5, 24, 12, 0)
+            assert add_lap("LHM", start, start + timedelta(minutes=1, seconds=5))
+
+        archived = client.get("/api/v1/report/?season=2017&fields=id").get_json()
+        current = client.get("/api/v1/report/?fields=id").get_json()
+        assert {"id": "LHM"} not in archived
+        assert current[1] == {"id": "LHM"}
+
+    def test_many_seasons(self, client: FlaskClient, many_archived_seasons):
+        """Test shards are not attached to connections of the current shard.
+
+        Args:
+            client: Flask test client.
+            many_archived_seasons: fixture which archives seasons.
+        """
+        assert db_wrapper.database.seasons() == many_archived_seasons
+        assert client.get("/api/v1/report/?fields=id").status_code == 200
+        assert client.get("/api/v1/report/drivers/SVF?season=2006&fields=place").get_json() == {"place": 1}
+
+    def test_attach_too_many_shards(self, client: FlaskClient, many_archived_seasons):
+        """Test no more than MAX_ATTACHED shards are attached at once.
+
+        Args:
+            client: Flask test client.
+            many_archived_seasons: fixture which archives seasons.
+        """
+        with pytest.raises(ValueError):
+            with db_wrapper.database.attached(many_archived_seasons):
+                pass
+
+    def test_archive_invalid_season(self, client: FlaskClient):
+        """Test season which can not be a name of a shard is not archived.
+
+        Args:
+            client: Flask test client.
+        """
+        with client.application.app_context(), pytest.raises(ValueError):
+            archive_season("../2017")
+
+
+class TestDriverHistory:
+    """
+    Tests for [GET] "/api/v1/report/drivers/{driver_id}/history"
+    """
+
+    def test_history(self, client: FlaskClient, archived_season):
+        """Test results are read from attached shards.
+
+        Args:
+            client: Flask test client.
+            archived_season: fixture which archives a season.
+        """
+        history = client.get("/api/v1/report/drivers/svf/history").get_json()
+        assert history == [{"season": "2017", "team": "FERRARI", "lap_time": "1:05.000", "place": 1},
+                           {"season": "2018", "team": "FERRARI", "lap_time": "1:04.415", "place": 1}]
+
+    def test_history_without_archived_result(self, client: FlaskClient, archived_season):
+        """Test seasons without result of the driver are skipped.
+
+        Args:
+            client: Flask test client.
+            archived_season: fixture which archives a season.
+        """
+        history = client.get("/api/v1/report/drivers/LHM/history").get_json()
+        assert [result["season"] for result in history] == ["2018"]
+
+    def test_history_without_archived_seasons(self, client: FlaskClient):
+        """Test history of the current season only.
+
+        Args:
+            client: Flask test client.
+        """
+        history = client.get("/api/v1/report/drivers/SVF/history?format=xml")
+        assert b"<season>2018</season>" in history.data
+
+    def test_history_not_found(self, client: FlaskClient):
+        """Test error message when driver has no results.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/report/drivers/XXX/history")
+        assert "XXX" in response.get_json()["error"]
+
+    def test_history_of_many_seasons(self, client: FlaskClient, many_archived_seasons):
+        """Test results are read from shards attached in batches.
+
+        Args:
+            client: Flask test client.
+            many_archived_seasons: fixture which archives seasons.
+        """
+        history = client.get("/api/v1/report/drivers/SVF/history").get_json()
+        assert [result["season"] for result in history] == many_archived_seasons + ["2018"]
+        assert {result["lap_time"] for result in history} == {"1:04.415"}
@@ -0,0 +1,116 @@
+"""Tests for live leaderboard stream"""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from flask.testing import FlaskClient
+
+from app.db.scripts.db_scripts import add_lap
+from app.stream import broadcaster
+from app.constants import END_LOG
+
+
+def parse_event(message: str) -> tuple[str, object]:
+    """Parse Server-Sent Event.
+
+    Args:
+        message: event in text/event-stream format.
+
+    Returns:
+        event name and data.
+    """
+    lines = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+class TestReportStream:
+    """
+    Tests for [GET] "/api/v1/report/stream"
+    """
+
+    def test_standings_and_changes(self, client: FlaskClient, restore_data):
+        """Test standings are sent first and then only place changes.
+
+        Args:
+            client: Flask test client.
+            restore_data: fixture which restores data.
+        """
+        response = client.get("/api/v1/report/stream", buffered=False)
+        assert "text/event-stream" in response.headers["Content-Type"]
+        events = iter(response.response)
+        try:
+            event, standings = parse_event(next(events).decode())
+            assert event == "standings"
+            assert len(standings) == 19
+            assert standings[0]["id"] == "SVF"
+
+            start = datetime(2018, 5, 24, 12, 30)
+            with client.application.app_context():
+                # Slower lap doesn't change the result.
+                assert not add_lap("LHM", start, start + timedelta(minutes=10))
+                assert add_lap("LHM", start, start + timedelta(seconds=60))
+
+            event, changes = parse_event(next(events).decode())
+            assert event == "places"
+            assert changes[0] == {"id": "LHM", "place": 1, "lap_time": "1:00.000"}
+            # Everyone who was ahead of the driver moved one place down.
+            assert len(changes) == 19
+        finally:
+            response.close()
+
+        assert not broadcaster.has_subscribers()
+        report = client.get("/api/v1/report/?fields=place,id").get_json()
+        assert report[0] == {"place": 1, "id": "LHM"}
+
+    def test_changes_after_reload_by_another_process(self, client: FlaskClient, tmp_path,
+                                                     restore_data):
+        """Test place changes are sent when another process reloads data.
+
+        Args:
+            client: Flask test client.
+            tmp_path: temporary directory.
+            restore_data: fixture which restores data.
+        """
+        # LHM finishes a lap of 1:00.000 in the new end log.
+        end_log = tmp_path / "end.log"
+        with open(END_LOG, encoding="utf8") as file:
+            end_log.write_text(file.read().replace("LHM2018-05-24_12:18:20.125",
+                                                   "LHM2018-05-24_12:12:32.585"))
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = f"""from app import create_app
+from app.constants import TESTING
+from app.db.scripts import db_scripts
+
+app = create_app(TESTING)
+db_scripts.END_LOG = {str(end_log)!r}
+with app.app_context():
+    db_scripts.reload_database()
+"""
+        response = client.get("/api/v1/report/stream", buffered=False)
+        events = iter(response.response)
+        try:
+            event, _ = parse_event(next(events).decode())
+            assert event == "standings"
+
+            subprocess.run([sys.executable, "-c", script], cwd=root, check=True, timeout=120)
+            # Swap is detected by the next request.
+            client.get("/api/v1/report/drivers/LHM")
+
+            event, changes = parse_event(next(events).decode())
+            assert event == "places"
+            assert changes[0] == {"id": "LHM", "place": 1, "lap_time": "1:00.000"}
+        finally:
+            response.close()
+
+    def test_unknown_driver(self, client: FlaskClient):
+        """Test lap of unknown driver is not added.
+
+        Args:
+            client: Flask test client.
+        """
+        start = datetime(2018, 5, 24, 12, 30)
+        with client.application.app_context(), pytest.raises(UserWarning):
+            add_lap("XXX", start, start + timedelta(seconds=60))
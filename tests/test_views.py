@@ -1,8 +1,16 @@
 """Tests for API endpoints"""
+import gzip
+import zlib
+from datetime import datetime, timedelta
+
 import pytest
 from flask.testing import FlaskClient
 import xml.etree.ElementTree as ET
 
+from app.extensions import db_wrapper
+from app.db.models import Driver, Result, Filters
+from app.db.scripts.db_scripts import add_lap
+
 
 class TestReport:
     """
@@ -201,8 +209,8 @@ class TestSingleDriver:
         """
         response = client.get("/api/v1/report/drivers/BHS")
         driver = response.get_json()
-        # Return dict with 5 key-value pairs
-        assert len(driver) == 5
+        # Return dict with 9 key-value pairs
+        assert len(driver) == 9
 
 
 class TestErrorResponse:
@@ -253,3 +261,286 @@ class TestErrorResponse:
         response = client.get("/api/v1/report/drivers/test?format=xml")
         response_xml = ET.fromstring(response.data)
         assert "404 Not Found" in response_xml.text
+
+
+class TestFields:
+    """
+    Tests for fields parameter.
+    """
+
+    @pytest.mark.parametrize("url, fields", [("/api/v1/report/?fields=place,id", {"place", "id"}),
+                                             ("/api/v1/report/?fields=lap_time", {"lap_time"}),
+                                             ("/api/v1/report/drivers/?fields=id", {"id"}),
+                                             ("/api/v1/report/drivers/BHS?fields=id,team", {"id", "team"})])
+    def test_response_content_in_json(self, client: FlaskClient, url, fields):
+        """Test only requested fields are returned in json format.
+
+        Args:
+            client: Flask test client.
+            url: request path with parameters.
+            fields: expected keys of the driver object.
+        """
+        data = client.get(url).get_json()
+        driver = data[0] if isinstance(data, list) else data
+        assert set(driver) == fields
+
+    def test_response_content_in_xml(self, client: FlaskClient):
+        """Test only requested fields are returned in xml format in requested order.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/report/?fields=place,id&format=xml")
+        response_xml = ET.fromstring(response.data)
+        assert [element.tag for element in response_xml[0]] == ["place", "id"]
+        assert response_xml[0][0].text == "1"
+        assert response_xml[0][1].text == "SVF"
+
+    def test_place_with_order(self, client: FlaskClient):
+        """Test place is kept when only place is requested in desc order.
+
+        Args:
+            client: Flask test client.
+        """
+        drivers = client.get("/api/v1/report/?fields=place&order=desc").get_json()
+        assert [driver["place"] for driver in drivers] == list(range(19, 0, -1))
+
+    def test_unknown_field(self, client: FlaskClient):
+        """Test error is returned for unknown field.
+
+        Args:
+            client: Flask test client.
+        """
+        error = client.get("/api/v1/report/drivers/?fields=id,team").get_json()
+        assert "400 Bad Request" in error["error"]
+
+
+class TestCompression:
+    """
+    Tests for compressed responses.
+    """
+
+    @pytest.mark.parametrize("encoding, decompress", [("gzip", gzip.decompress),
+                                                      ("deflate", zlib.decompress)])
+    def test_response_content(self, client: FlaskClient, encoding, decompress):
+        """Test body is compressed with accepted encoding.
+
+        Args:
+            client: Flask test client.
+            encoding: accepted encoding.
+            decompress: function to decompress body.
+        """
+        plain = client.get("/api/v1/report/?format=xml").data
+        response = client.get("/api/v1/report/?format=xml", headers={"Accept-Encoding": encoding})
+        assert response.headers["Content-Encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert decompress(response.data) == plain
+
+    def test_response_not_compressed(self, client: FlaskClient):
+        """Test body is not compressed if encoding is not accepted.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/report/", headers={"Accept-Encoding": "br, gzip;q=0"})
+        assert "Content-Encoding" not in response.headers
+        assert len(response.get_json()) == 19
+
+    def test_cached_response(self, client: FlaskClient):
+        """Test repeated request is served with the same compressed body.
+
+        Args:
+            client: Flask test client.
+        """
+        first = client.get("/api/v1/report/drivers/?order=desc", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/api/v1/report/drivers/?order=desc", headers={"Accept-Encoding": "gzip"})
+        assert second.headers["Content-Encoding"] == "gzip"
+        assert second.data == first.data
+
+
+class TestBulkFormats:
+    """
+    Tests for csv and columnar json formats.
+    """
+
+    @pytest.mark.parametrize("url, header, first_row", [
+        ("/api/v1/report/?format=csv", "name,surname,team,lap_time,place",
+         "Sebastian,Vettel,FERRARI,1:04.415,1"),
+        ("/api/v1/report/?format=csv&order=desc&fields=place,id", "place,id", "19,LHM"),
+        ("/api/v1/report/drivers/?format=csv", "id,name,surname", "BHS,Brendon,Hartley")])
+    def test_csv_content(self, client: FlaskClient, url, header, first_row):
+        """Test content in csv format.
+
+        Args:
+            client: Flask test client.
+            url: request path with parameters.
+            header: expected csv header.
+            first_row: expected first row.
+        """
+        response = client.get(url)
+        lines = response.get_data(as_text=True).splitlines()
+        assert "text/csv" in response.headers["Content-Type"]
+        assert lines[0] == header
+        assert lines[1] == first_row
+        assert len(lines) == 20
+
+    def test_columns_content(self, client: FlaskClient):
+        """Test content in columnar json format matches json format.
+
+        Args:
+            client: Flask test client.
+        """
+        report = client.get("/api/v1/report/?order=desc").get_json()
+        columnar = client.get("/api/v1/report/?order=desc&format=columns").get_json()
+        assert columnar["columns"] == ["name", "surname", "team", "lap_time", "place"]
+        assert [dict(zip(columnar["columns"], row)) for row in columnar["rows"]] == report
+
+
+class TestChangesSinceVersion:
+    """
+    Tests for since parameter.
+    """
+
+    def test_all_results(self, client: FlaskClient):
+        """Test all results are changed since version 0.
+
+        Args:
+            client: Flask test client.
+        """
+        changes = client.get("/api/v1/report/?since=0").get_json()
+        assert changes["version"] >= 1
+        assert changes["rows"] == client.get("/api/v1/report/").get_json()
+
+    def test_no_changes(self, client: FlaskClient):
+        """Test no results are changed since current version.
+
+        Args:
+            client: Flask test client.
+        """
+        version = client.get("/api/v1/report/?since=0").get_json()["version"]
+        response = client.get(f"/api/v1/report/?since={version}&format=xml")
+        response_xml = ET.fromstring(response.data)
+        assert response_xml.find("version").text == str(version)
+        assert len(response_xml.find("rows")) == 0
+
+    def test_invalid_version(self, client: FlaskClient):
+        """Test error is returned for invalid version.
+
+        Args:
+            client: Flask test client.
+        """
+        error = client.get("/api/v1/report/?since=-1").get_json()
+        assert "400 Bad Request" in error["error"]
+
+    @pytest.mark.parametrize("response_format", ["csv", "columns"])
+    def test_bulk_format(self, client: FlaskClient, response_format: str):
+        """Test error is returned for changes in bulk format.
+
+        Args:
+            client: Flask test client.
+            response_format: bulk format.
+        """
+        error = client.get(f"/api/v1/report/?since=0&format={response_format}").get_json()
+        assert error["error"] == "400 Bad Request: Changes since version are returned only " \
+                                 f"in json or xml format, got '{response_format}'."
+
+    def test_index_is_used(self, client: FlaskClient):
+        """Test changed results are found with index on version.
+
+        Args:
+            client: Flask test client.
+        """
+        with client.application.app_context(), db_wrapper.database.connection_context():
+            query = Result.changes_query(0, None, ("id",), Filters())
+            sql, params = query.sql()
+            plan = db_wrapper.database.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        assert "USING COVERING INDEX result_version (version>?)" in str(plan)
+
+
+class TestFilters:
+    """
+    Tests for filter parameters.
+    """
+
+    @pytest.mark.parametrize("url, result", [
+        ("/api/v1/report/?team=ferrari&fields=id", ["SVF", "KRF"]),
+        ("/api/v1/report/?lap_min=1:12.6&lap_max=1:12.9&fields=id", ["KRF", "FAM", "CLS", "SPF"]),
+        ("/api/v1/report/?name_prefix=H&order=desc&fields=id", ["LHM", "BHS", "NHR"]),
+        ("/api/v1/report/?team=Haas Ferrari&lap_max=1:13&fields=id", ["RGH"]),
+        ("/api/v1/report/drivers/?team=force india mercedes&fields=id", ["EOF", "SPF"]),
+        ("/api/v1/report/drivers/?lap_max=1:13.2&name_prefix=S&fields=id", ["CSR"]),
+        ("/api/v1/report/drivers/?lap_max=1:12.7&name_prefix=S&fields=id", [])])
+    def test_response_content_in_json(self, client: FlaskClient, url, result):
+        """Test filtered content in json format.
+
+        Args:
+            client: Flask test client.
+            url: request path with parameters.
+            result: expected ids of drivers.
+        """
+        drivers = client.get(url).get_json()
+        assert [driver["id"] for driver in drivers] == result
+
+    def test_place_is_kept(self, client: FlaskClient):
+        """Test filtered report keeps places of the whole report.
+
+        Args:
+            client: Flask test client.
+        """
+        report = client.get("/api/v1/report/?team=mercedes&fields=place,id").get_json()
+        assert report == [{"place": 2, "id": "VBM"}, {"place": 19, "id": "LHM"}]
+
+    def test_csv_content(self, client: FlaskClient):
+        """Test filtered content in csv format.
+
+        Args:
+            client: Flask test client.
+        """
+        response = client.get("/api/v1/report/drivers/?format=csv&name_prefix=Sa&fields=id,surname")
+        assert response.get_data(as_text=True).splitlines() == ["id,surname", "CSR,Sainz"]
+
+    def test_laps_of_ten_minutes(self, client: FlaskClient, restore_data):
+        """Test laps of ten minutes or more are filtered and placed as longer laps.
+
+        Args:
+            client: Flask test client.
+            restore_data: fixture which restores data.
+        """
+        assert len(client.get("/api/v1/report/?lap_max=10:00&fields=id").get_json()) == 19
+
+        with client.application.app_context():
+            with db_wrapper.database.connection_context():
+                Driver.create(id="TEN", name="Ten", surname="Minutes", team_id=1)
+            start = datetime(2018, 5, 24, 12, 0)
+            assert add_lap("TEN", start, start + timedelta(minutes=10, seconds=5))
+
+        report = client.get("/api/v1/report/?fields=place,id,lap_time").get_json()
+        assert report[-1] == {"place": 20, "id": "TEN", "lap_time": "10:05.000"}
+        assert client.get("/api/v1/report/?lap_min=10:00&fields=id").get_json() == [{"id": "TEN"}]
+        assert client.get("/api/v1/report/drivers/TEN?fields=place,ahead").get_json()["place"] == 20
+
+    def test_invalid_lap_time(self, client: FlaskClient):
+        """Test error is returned for invalid lap time.
+
+        Args:
+            client: Flask test client.
+        """
+        error = client.get("/api/v1/report/?lap_min=72").get_json()
+        assert "400 Bad Request" in error["error"]
+
+    @pytest.mark.parametrize("parameters, index", [({"team": "FERRARI"}, "team_name"),
+                                                   ({"lap_min": 72000}, "result_lap_ms"),
+                                                   ({"name_prefix": "Ha"}, "driver_surname")])
+    def test_index_is_used(self, client: FlaskClient, parameters, index):
+        """Test filters are supported by indexes.
+
+        Args:
+            client: Flask test client.
+            parameters: filters.
+            index: name of the index which should be used.
+        """
+        with client.application.app_context(), db_wrapper.database.connection_context():
+            query = Result.report_query(None, ("id",), Filters(**parameters))
+            sql, params = query.sql()
+            plan = db_wrapper.database.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        assert index in str(plan)